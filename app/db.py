@@ -1,38 +1,502 @@
 from __future__ import annotations
 
+import asyncio
+import csv
+import functools
+import gzip
+import io
 import json
+import logging
+import os
+import re
+import heapq
+import shutil
+import socket
 import sqlite3
 import sys
+import threading
+import time
+import weakref
+import zlib
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
 
 # Resolve a writable data directory:
 # - Dev: <repo-root>/data
 # - Packaged (PyInstaller): <exe-dir>/data
+# - CRISPINO_DATA_DIR overrides both (benchmarks, maintenance on a copy)
 if getattr(sys, "frozen", False):
     APP_HOME = Path(sys.executable).resolve().parent  # EXE directory
 else:
     APP_HOME = Path(__file__).resolve().parents[1]  # repo root
 
-DATA_DIR = APP_HOME / "data"
+DATA_DIR = Path(os.environ.get("CRISPINO_DATA_DIR") or APP_HOME / "data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 DB_PATH = DATA_DIR / "crispino.db"
 
+# Number of server processes sharing DATA_DIR (scripts/launch.py sets it for
+# its uvicorn workers). With more than one, in-process state such as the
+# kitchen feed only sees this worker's orders, so callers fall back to the DB.
+SERVER_WORKERS = max(1, int(os.environ.get("CRISPINO_WORKERS") or 1))
+SCHEMA_LOCK_TIMEOUT = 120.0
+
+
+# --- Instrumentation ---
+# Prometheus-style metrics kept in process memory and rendered by GET /metrics.
+# Every connection from connect() times each statement it runs; set
+# CRISPINO_SQL_PROFILE=0 to turn that off. CRISPINO_SLOW_QUERY_MS enables the
+# slow-query log (logger "crispino.sql") for statements at or above the threshold.
+
+METRIC_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_PROFILE = os.environ.get("CRISPINO_SQL_PROFILE", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("CRISPINO_SLOW_QUERY_MS") or 0)
+SQL_PROFILE_MAX_STATEMENTS = 500
+
+slow_query_log = logging.getLogger("crispino.sql")
+
+_metrics: List[Any] = []
+
+
+def _label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[Any, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_label_value(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name, self.help, self.labelnames = name, help, labelnames
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+        _metrics.append(self)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {v:g}" for k, v in values]
+        return lines
+
+
+class Gauge:
+    """A gauge read from a callback at render time."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self.name, self.help, self._read = name, help, read
+        _metrics.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self._read():g}"]
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = METRIC_BUCKETS
+    ) -> None:
+        self.name, self.help, self.labelnames, self.buckets = name, help, labelnames, buckets
+        self._lock = threading.Lock()
+        # Per label set: one count per bucket, then +Inf overflow, observation count and sum.
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        _metrics.append(self)
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        idx = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[idx] += 1
+            series[-2] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                le = f'le="{bound:g}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative:g}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, inf)} {values[-2]:g}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {values[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {values[-2]:g}")
+        return lines
+
+
+_SQL_SPACE = re.compile(r"\s+")
+_SQL_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+@functools.lru_cache(maxsize=2048)
+def _statement_key(sql: str) -> str:
+    """Collapse whitespace and IN (?,?,...) lists so each query shape is one series."""
+    return _SQL_PARAM_LIST.sub("(?, ...)", _SQL_SPACE.sub(" ", sql).strip())[:300]
+
+
+class SqlProfiler:
+    """Call count, total and max time per SQL statement shape."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {}
+        _metrics.append(self)
+
+    def record(self, sql: str, seconds: float) -> None:
+        key = _statement_key(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= SQL_PROFILE_MAX_STATEMENTS:
+                    key = "<other>"
+                stats = self._stats.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+        if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+            slow_query_log.warning("slow query %.1fms [%s]: %s", seconds * 1000, threading.current_thread().name, key)
+
+    def top(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Statements by total time spent, heaviest first."""
+        with self._lock:
+            stats = [(k, list(v)) for k, v in self._stats.items()]
+        stats.sort(key=lambda kv: kv[1][1], reverse=True)
+        return [
+            {"statement": k, "calls": int(v[0]), "total_seconds": v[1], "max_seconds": v[2]}
+            for k, v in stats[:limit]
+        ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def render(self) -> List[str]:
+        name = "crispino_sql_statement_seconds"
+        lines = [f"# HELP {name} Time spent executing each SQL statement shape", f"# TYPE {name} summary"]
+        with self._lock:
+            stats = sorted((k, list(v)) for k, v in self._stats.items())
+        for key, (calls, total, _) in stats:
+            label = _labels(("statement",), (key,))
+            lines.append(f"{name}_count{label} {calls:g}")
+            lines.append(f"{name}_sum{label} {total:.6f}")
+        lines += [
+            "# HELP crispino_sql_statement_max_seconds Slowest single execution of each SQL statement shape",
+            "# TYPE crispino_sql_statement_max_seconds gauge",
+        ]
+        lines += [
+            f"crispino_sql_statement_max_seconds{_labels(('statement',), (key,))} {longest:.6f}"
+            for key, (_, _, longest) in stats
+        ]
+        return lines
+
+
+sql_profiler = SqlProfiler()
+db_connects = Histogram("crispino_db_connect_seconds", "Time to open and configure a SQLite connection")
+checkout_lock_wait = Histogram(
+    "crispino_checkout_lock_wait_seconds", "Time checkouts wait for the in-process checkout lock"
+)
+write_lock_wait = Histogram(
+    "crispino_sqlite_write_lock_wait_seconds", "Time BEGIN IMMEDIATE waits for the SQLite write lock", ("caller",)
+)
+executor_wait = Histogram(
+    "crispino_executor_queue_seconds", "Time db calls wait for a free executor thread", ("executor",)
+)
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    def execute(self, sql: str, parameters: Any = ()) -> "ProfiledCursor":
+        t0 = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            sql_profiler.record(sql, time.perf_counter() - t0)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> "ProfiledCursor":
+        t0 = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            sql_profiler.record(sql, time.perf_counter() - t0)
+
+    def executescript(self, sql_script: str) -> "ProfiledCursor":
+        t0 = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            sql_profiler.record(sql_script, time.perf_counter() - t0)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose statements (via execute* or cursor()) feed sql_profiler."""
+
+    def cursor(self, factory: Any = ProfiledCursor) -> sqlite3.Cursor:
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters: Any = ()) -> sqlite3.Cursor:
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any) -> sqlite3.Cursor:
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script: str) -> sqlite3.Cursor:
+        return self.cursor().executescript(sql_script)
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in list(_metrics):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Per-connection tuning, applied once when a pooled connection is opened.
+SQLITE_CACHE_SIZE_KB = 16 * 1024
+SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
 
 def connect() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Open a new, fully configured connection (callers own it and must close it)."""
+    with db_connects.time():
+        conn = sqlite3.connect(
+            DB_PATH,
+            timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=ProfiledConnection if SQL_PROFILE else sqlite3.Connection,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
     return conn
 
 
+class _ThreadConnection:
+    """A thread's pooled connection plus its nesting depth."""
+
+    __slots__ = ("conn", "path", "depth", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection, path: Path) -> None:
+        self.conn = conn
+        self.path = path
+        self.depth = 0
+
+
+class ConnectionPool:
+    """Long-lived, per-thread SQLite connections.
+
+    Each thread (including FastAPI's threadpool workers) gets its own connection on
+    first use and keeps it until the thread exits or close_all() is called; worker
+    threads that the threadpool retires when idle take their connection (and its
+    file handles) with them. Nested acquire() calls on the same thread share the
+    connection; release() only rolls back an abandoned transaction once the
+    outermost caller is done with it.
+    """
+
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: List[sqlite3.Connection] = []
+
+    def acquire(self) -> sqlite3.Connection:
+        held = getattr(self._local, "held", None)
+        if held is not None and held.path != DB_PATH:
+            # DB_PATH was re-pointed (e.g. maintenance scripts): drop the stale handle.
+            self._discard(held)
+            held = None
+        if held is None:
+            held = _ThreadConnection(connect(), DB_PATH)
+            with self._lock:
+                self._conns.append(held.conn)
+            # The thread-local holder is dropped when its thread exits; close with it.
+            weakref.finalize(held, self._close, held.conn)
+            self._local.held = held
+        held.depth += 1
+        return held.conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        held = getattr(self._local, "held", None)
+        if held is None or held.conn is not conn:
+            return
+        held.depth = max(0, held.depth - 1)
+        if held.depth == 0 and conn.in_transaction:
+            conn.rollback()
+
+    def _close(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if conn in self._conns:
+                self._conns.remove(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _discard(self, held: _ThreadConnection) -> None:
+        self._local.held = None
+        self._close(held.conn)
+
+    def close_all(self) -> None:
+        """Close every pooled connection (call on application shutdown)."""
+        with self._lock:
+            conns, self._conns = self._conns, []
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
+
+_pool = ConnectionPool()
+Gauge("crispino_db_pool_connections", "Open pooled SQLite connections", lambda: len(_pool._conns))
+
+
+def acquire() -> sqlite3.Connection:
+    return _pool.acquire()
+
+
+def release(conn: sqlite3.Connection) -> None:
+    _pool.release(conn)
+
+
+def close_pool() -> None:
+    _pool.close_all()
+
+
+# --- Async access ---
+# Async handlers hand blocking SQLite work to dedicated executors instead of
+# Starlette's shared threadpool. Interactive work (checkout, POS pages, order
+# lookups) and long-running work (reports, exports, backups, renumbering) get
+# separate bounded pools, so a slow export can only ever occupy the background
+# workers. Each executor thread keeps its own pooled connection.
+
+DB_EXECUTOR_WORKERS = int(os.environ.get("CRISPINO_DB_WORKERS", "8"))
+BACKGROUND_EXECUTOR_WORKERS = int(os.environ.get("CRISPINO_BACKGROUND_WORKERS", "2"))
+
+T = TypeVar("T")
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(kind: str) -> ThreadPoolExecutor:
+    executor = _executors.get(kind)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(kind)
+            if executor is None:
+                workers = DB_EXECUTOR_WORKERS if kind == "db" else BACKGROUND_EXECUTOR_WORKERS
+                executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix=f"crispino-{kind}")
+                _executors[kind] = executor
+    return executor
+
+
+def _queued(kind: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> Callable[[], T]:
+    submitted = time.perf_counter()
+
+    def call() -> T:
+        executor_wait.observe(time.perf_counter() - submitted, kind)
+        return fn(*args, **kwargs)
+
+    return call
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await a short blocking db call on the interactive executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor("db"), _queued("db", fn, *args, **kwargs))
+
+
+async def run_background(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Await a long-running db call (report, export, backup) on the background executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor("background"), _queued("background", fn, *args, **kwargs))
+
+
+async def iterate_background(chunks: Iterator[T]) -> AsyncIterator[T]:
+    """Drive a blocking chunk iterator (streamed exports) on the background executor."""
+    done = object()
+    while True:
+        chunk = await run_background(next, chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def shutdown_executors() -> None:
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=True)
+
+
 def now_iso() -> str:
     return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
 
+@contextmanager
+def process_lock(name: str, timeout: float = 0.0) -> Iterator[bool]:
+    """Mutex shared by every process using DATA_DIR; yields whether it was acquired.
+
+    The lock is an exclusive transaction on an empty SQLite file next to the
+    database, so it relies only on SQLite's own file locking (the same on
+    every platform the POS runs on) and is dropped by the OS if the holder dies.
+    """
+    lock = sqlite3.connect(str(DATA_DIR / f"{name}.lock"), timeout=timeout, isolation_level=None)
+    try:
+        try:
+            lock.execute("BEGIN EXCLUSIVE")
+        except sqlite3.OperationalError:
+            yield False
+            return
+        yield True
+    finally:
+        lock.close()
+
+
 def ensure_schema() -> None:
-    conn = connect()
+    """Create tables, run migrations and seed defaults.
+
+    Every worker calls this on startup; the schema lock makes them take turns,
+    so the first one does the work and the rest find nothing left to do.
+    """
+    with process_lock("schema", timeout=SCHEMA_LOCK_TIMEOUT) as locked:
+        if not locked:
+            raise RuntimeError("Timed out waiting for another process to finish setting up the database")
+        _ensure_schema()
+
+
+def _ensure_schema() -> None:
+    conn = acquire()
     try:
         cur = conn.cursor()
         cur.execute(
@@ -94,6 +558,8 @@ def ensure_schema() -> None:
             """
         )
 
+        run_migrations(conn)
+
         # Defaults
         if not get_setting("cafe_name", conn=conn):
             set_setting("cafe_name", "Crispino Cafe", conn=conn)
@@ -101,8 +567,6 @@ def ensure_schema() -> None:
             set_setting("tax_rate_percent", "0", conn=conn)
         if not get_setting("admin_pin", conn=conn):
             set_setting("admin_pin", "1234", conn=conn)
-        if not get_setting("order_seq", conn=conn):
-            set_setting("order_seq", "1000", conn=conn)
 
         # Best-effort unique indexes (skip if current data violates)
         try:
@@ -121,14 +585,274 @@ def ensure_schema() -> None:
         if cnt == 0:
             seed_menu(conn)
         conn.commit()
+        invalidate_menu_cache()
     finally:
-        conn.close()
+        release(conn)
+
+
+def _m001_hot_query_indexes(conn: sqlite3.Connection) -> None:
+    # Lines by order (get_order, report joins); covers the report aggregates too.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order ON order_items(order_id, name, category_name, qty, unit_price_cents)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_orders_created_at ON orders(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_items_category_sort ON items(category_id, sort_order)")
+
+
+def _m002_sales_rollups(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_item (
+            day TEXT NOT NULL,
+            item_name TEXT NOT NULL,
+            category_name TEXT NOT NULL,
+            qty INTEGER NOT NULL DEFAULT 0,
+            revenue_cents INTEGER NOT NULL DEFAULT 0,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, item_name, category_name)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_daily_payment (
+            day TEXT NOT NULL,
+            payment_method TEXT NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            tax_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, payment_method)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS sales_hourly (
+            day TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, hour)
+        ) WITHOUT ROWID
+        """
+    )
+    _rebuild_rollups(conn)
+
+
+def _m003_order_search_fts(conn: sqlite3.Connection) -> None:
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(number, note, items, tokenize='unicode61')"
+        )
+    except sqlite3.OperationalError:
+        return  # SQLite built without FTS5: search_orders falls back to LIKE
+    _rebuild_order_fts(conn)
+
+
+def _rebuild_order_fts(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM orders_fts")
+    conn.execute(
+        """INSERT INTO orders_fts(rowid, number, note, items)
+           SELECT o.id, o.number, COALESCE(o.note, ''),
+                  COALESCE((SELECT GROUP_CONCAT(oi.name, ' ') FROM order_items oi WHERE oi.order_id = o.id), '')
+           FROM orders o"""
+    )
+
+
+def _m004_order_sequence(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS order_sequence (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        """
+    )
+    # Continue from the old settings counter (or the highest number handed out).
+    conn.execute(
+        """INSERT OR IGNORE INTO order_sequence(name, value)
+           SELECT 'orders', MAX(
+               COALESCE((SELECT CAST(value AS INTEGER) FROM settings WHERE key = 'order_seq'), 1000),
+               COALESCE((SELECT MAX(number) FROM orders), 1000))"""
+    )
+    conn.execute("DELETE FROM settings WHERE key = 'order_seq'")
+
+
+def _m005_order_idempotency_key(conn: sqlite3.Connection) -> None:
+    cols = {r["name"] for r in conn.execute("PRAGMA table_info(orders)")}
+    if "idempotency_key" not in cols:
+        conn.execute("ALTER TABLE orders ADD COLUMN idempotency_key TEXT")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_orders_idempotency_key ON orders(idempotency_key) "
+        "WHERE idempotency_key IS NOT NULL"
+    )
+
+
+# Menu change tracking. Every write to categories, items or settings bumps the
+# single-row menu_version counter and stamps the touched row with the new
+# value; deletions (and ids that disappear in a renumber) leave a tombstone in
+# menu_deletions. Clients ask for everything newer than the version they hold.
+# Triggers keep this right for every writer, including maintenance scripts.
+_MENU_BUMP = "UPDATE menu_version SET version = version + 1 WHERE id = 1"
+_MENU_CURRENT = "(SELECT version FROM menu_version WHERE id = 1)"
+_MENU_TABLES = (
+    ("categories", "category", ("name", "sort_order")),
+    ("items", "item", ("name", "price_cents", "category_id", "available", "sort_order")),
+)
+
+
+def _create_menu_version_triggers(conn: sqlite3.Connection) -> None:
+    for table, kind, columns in _MENU_TABLES:
+        changed = " OR ".join(f"NEW.{c} IS NOT OLD.{c}" for c in ("id",) + columns)
+        conn.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_version_insert AFTER INSERT ON {table}
+                BEGIN
+                    {_MENU_BUMP};
+                    UPDATE {table} SET version = {_MENU_CURRENT} WHERE id = NEW.id;
+                    DELETE FROM menu_deletions WHERE kind = '{kind}' AND id = NEW.id;
+                END"""
+        )
+        # The version stamp below is itself an UPDATE; the WHEN clause keeps it from re-triggering.
+        conn.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_version_update AFTER UPDATE ON {table}
+                WHEN NEW.version = OLD.version AND ({changed})
+                BEGIN
+                    {_MENU_BUMP};
+                    UPDATE {table} SET version = {_MENU_CURRENT} WHERE id = NEW.id;
+                    INSERT OR REPLACE INTO menu_deletions(kind, id, version)
+                        SELECT '{kind}', OLD.id, {_MENU_CURRENT} WHERE OLD.id <> NEW.id;
+                END"""
+        )
+        conn.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_version_delete AFTER DELETE ON {table}
+                BEGIN
+                    {_MENU_BUMP};
+                    INSERT OR REPLACE INTO menu_deletions(kind, id, version) VALUES('{kind}', OLD.id, {_MENU_CURRENT});
+                END"""
+        )
+    settings_bump = "UPDATE menu_version SET version = version + 1, settings_version = version + 1 WHERE id = 1"
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS settings_version_insert AFTER INSERT ON settings BEGIN {settings_bump}; END")
+    conn.execute(
+        f"""CREATE TRIGGER IF NOT EXISTS settings_version_update AFTER UPDATE ON settings
+            WHEN NEW.value IS NOT OLD.value BEGIN {settings_bump}; END"""
+    )
+
+
+def _touch_menu_table(conn: sqlite3.Connection, table: str, kind: str, old_ids: Iterable[int]) -> None:
+    """Stamp every row of a rebuilt menu table as changed and tombstone ids that no longer exist."""
+    conn.execute(_MENU_BUMP)
+    conn.execute(f"UPDATE {table} SET version = {_MENU_CURRENT}")
+    conn.executemany(
+        f"""INSERT OR REPLACE INTO menu_deletions(kind, id, version)
+            SELECT ?, ?, {_MENU_CURRENT} WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE id = ?)""",
+        [(kind, old_id, old_id) for old_id in old_ids],
+    )
+
+
+def _m006_menu_versions(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS menu_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            settings_version INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT OR IGNORE INTO menu_version(id, version, settings_version) VALUES(1, 1, 1)")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS menu_deletions (
+            kind TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            version INTEGER NOT NULL,
+            PRIMARY KEY (kind, id)
+        )
+        """
+    )
+    for table, _, _ in _MENU_TABLES:
+        cols = {r["name"] for r in conn.execute(f"PRAGMA table_info({table})")}
+        if "version" not in cols:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    _create_menu_version_triggers(conn)
+
+
+# Ordered, append-only list of schema migrations: (version, description, apply).
+def _m007_print_claims(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS print_claims (
+            order_id INTEGER NOT NULL,
+            copy TEXT NOT NULL,
+            claimed_at TEXT NOT NULL,
+            PRIMARY KEY (order_id, copy)
+        ) WITHOUT ROWID
+        """
+    )
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, "indexes for order, report and menu queries", _m001_hot_query_indexes),
+    (2, "daily/hourly sales rollup tables", _m002_sales_rollups),
+    (3, "full-text order search index", _m003_order_search_fts),
+    (4, "dedicated order number sequence", _m004_order_sequence),
+    (5, "checkout idempotency keys", _m005_order_idempotency_key),
+    (6, "menu change versions for client delta sync", _m006_menu_versions),
+    (7, "print spool claims shared by worker processes", _m007_print_claims),
+]
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT COALESCE(MAX(version), 0) AS v FROM schema_version").fetchone()
+    return int(row["v"])
+
+
+def run_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending MIGRATIONS in order, one transaction each. Returns the versions applied.
+
+    Each migration runs inside an explicit BEGIN: the sqlite3 module only opens
+    transactions implicitly before DML, so DDL would otherwise autocommit and a
+    failing migration could leave half its schema behind without its
+    schema_version row.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        );
+        """
+    )
+    conn.commit()
+    applied: List[int] = []
+    current = schema_version(conn)
+    for version, description, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            conn.execute("BEGIN")
+            apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version(version, description, applied_at) VALUES(?,?,?)",
+                (version, description, now_iso()),
+            )
+        applied.append(version)
+    global _order_fts
+    _order_fts = None  # re-detect the search index on next use
+    return applied
+
+
+def _day_bounds(date: str) -> Tuple[str, str]:
+    """[start, end) timestamps for a YYYY-MM-DD day, usable as an index range on created_at."""
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return day.strftime("%Y-%m-%d"), (day + timedelta(days=1)).strftime("%Y-%m-%d")
 
 
 def seed_menu(conn: Optional[sqlite3.Connection] = None) -> None:
     close_after = False
     if conn is None:
-        conn = connect()
+        conn = acquire()
         close_after = True
     try:
         cur = conn.cursor()
@@ -154,26 +878,26 @@ def seed_menu(conn: Optional[sqlite3.Connection] = None) -> None:
         )
     finally:
         if close_after:
-            conn.close()
+            release(conn)
 
 
 def get_setting(key: str, *, conn: Optional[sqlite3.Connection] = None) -> Optional[str]:
     close_after = False
     if conn is None:
-        conn = connect()
+        conn = acquire()
         close_after = True
     try:
         row = conn.execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
         return row["value"] if row else None
     finally:
         if close_after:
-            conn.close()
+            release(conn)
 
 
 def set_setting(key: str, value: str, *, conn: Optional[sqlite3.Connection] = None) -> None:
     close_after = False
     if conn is None:
-        conn = connect()
+        conn = acquire()
         close_after = True
     try:
         conn.execute(
@@ -181,13 +905,14 @@ def set_setting(key: str, value: str, *, conn: Optional[sqlite3.Connection] = No
             (key, value),
         )
         conn.commit()
+        invalidate_menu_cache()
     finally:
         if close_after:
-            conn.close()
+            release(conn)
 
 
 def list_categories() -> List[sqlite3.Row]:
-    conn = connect()
+    conn = acquire()
     try:
         sql = """
             SELECT c.*, (
@@ -198,11 +923,11 @@ def list_categories() -> List[sqlite3.Row]:
         """
         return list(conn.execute(sql))
     finally:
-        conn.close()
+        release(conn)
 
 
 def list_items(include_unavailable: bool = False) -> List[sqlite3.Row]:
-    conn = connect()
+    conn = acquire()
     try:
         if include_unavailable:
             sql = """SELECT i.*, c.name AS category_name
@@ -215,7 +940,7 @@ def list_items(include_unavailable: bool = False) -> List[sqlite3.Row]:
                  ORDER BY c.sort_order, i.sort_order, i.name"""
         return list(conn.execute(sql))
     finally:
-        conn.close()
+        release(conn)
 
 
 def _next_category_sort(conn: sqlite3.Connection) -> int:
@@ -260,7 +985,7 @@ def _item_exists_in_category(
 
 
 def create_category(name: str, sort_order: Optional[int] = None) -> int:
-    conn = connect()
+    conn = acquire()
     try:
         name = name.strip()
         if not name:
@@ -271,9 +996,10 @@ def create_category(name: str, sort_order: Optional[int] = None) -> int:
             sort_order = _next_category_sort(conn)
         cur = conn.execute("INSERT INTO categories(name, sort_order) VALUES(?,?)", (name, sort_order))
         conn.commit()
+        invalidate_menu_cache()
         return int(cur.lastrowid)
     finally:
-        conn.close()
+        release(conn)
 
 
 def create_item(
@@ -283,7 +1009,7 @@ def create_item(
     available: bool = True,
     sort_order: Optional[int] = None,
 ) -> int:
-    conn = connect()
+    conn = acquire()
     try:
         name = name.strip()
         if not name:
@@ -299,9 +1025,10 @@ def create_item(
             (name, price_cents, category_id, 1 if available else 0, sort_order),
         )
         conn.commit()
+        invalidate_menu_cache()
         return int(cur.lastrowid)
     finally:
-        conn.close()
+        release(conn)
 
 
 def update_item(
@@ -313,7 +1040,7 @@ def update_item(
     available: Optional[bool] = None,
     sort_order: Optional[int] = None,
 ) -> bool:
-    conn = connect()
+    conn = acquire()
     try:
         if name is not None or category_id is not None:
             current = conn.execute("SELECT name, category_id FROM items WHERE id=?", (item_id,)).fetchone()
@@ -350,37 +1077,38 @@ def update_item(
         params.append(item_id)
         cur = conn.execute(f"UPDATE items SET {', '.join(fields)} WHERE id=?", params)
         conn.commit()
+        invalidate_menu_cache()
         return cur.rowcount > 0
     finally:
-        conn.close()
+        release(conn)
 
 
 def delete_item(item_id: int) -> bool:
-    conn = connect()
+    conn = acquire()
     try:
         cur = conn.execute("DELETE FROM items WHERE id=?", (item_id,))
         conn.commit()
+        invalidate_menu_cache()
         return cur.rowcount > 0
     finally:
-        conn.close()
+        release(conn)
 
 
 def delete_category(category_id: int) -> bool:
-    conn = connect()
+    conn = acquire()
     try:
         row = conn.execute("SELECT COUNT(*) AS c FROM items WHERE category_id=?", (category_id,)).fetchone()
         if int(row["c"]) > 0:
             return False
         cur = conn.execute("DELETE FROM categories WHERE id=?", (category_id,))
         conn.commit()
+        invalidate_menu_cache()
         return cur.rowcount > 0
     finally:
-        conn.close()
+        release(conn)
 
 
-def list_menu_grouped() -> Dict[str, List[Dict[str, Any]]]:
-    cats = list_categories()
-    items = list_items()
+def _group_menu(cats: List[sqlite3.Row], items: List[sqlite3.Row]) -> Dict[str, List[Dict[str, Any]]]:
     groups: Dict[str, List[Dict[str, Any]]] = {c["name"]: [] for c in cats}
     for i in items:
         groups.setdefault(i["category_name"], []).append(
@@ -389,10 +1117,187 @@ def list_menu_grouped() -> Dict[str, List[Dict[str, Any]]]:
     return groups
 
 
+def menu_version(conn: Optional[sqlite3.Connection] = None) -> int:
+    close_after = False
+    if conn is None:
+        conn = acquire()
+        close_after = True
+    try:
+        row = conn.execute("SELECT version FROM menu_version WHERE id = 1").fetchone()
+        return int(row["version"]) if row else 0
+    finally:
+        if close_after:
+            release(conn)
+
+
+def _menu_category(row: sqlite3.Row) -> Dict[str, Any]:
+    return {"id": row["id"], "name": row["name"], "sort_order": row["sort_order"]}
+
+
+def _menu_item(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "name": row["name"],
+        "price_cents": row["price_cents"],
+        "category_id": row["category_id"],
+        "available": bool(row["available"]),
+        "sort_order": row["sort_order"],
+    }
+
+
+def list_menu_grouped() -> Dict[str, List[Dict[str, Any]]]:
+    return _group_menu(list_categories(), list_items())
+
+
 # Backward-compat: used by main.py
 get_menu_grouped = list_menu_grouped
 
 
+@dataclass(frozen=True)
+class MenuSnapshot:
+    generation: int
+    menu: Dict[str, List[Dict[str, Any]]]
+    categories: List[sqlite3.Row]
+    items: List[sqlite3.Row]  # includes unavailable items (admin view)
+    cafe_name: str
+    tax_rate_percent: str
+    printer_customer: str = ""
+    printer_kitchen: str = ""
+    version: int = 0  # menu_version at load time (shared by all processes, unlike generation)
+
+    @property
+    def tax_rate(self) -> float:
+        return float(self.tax_rate_percent or "0")
+
+
+MENU_RECHECK_SECONDS = 0.5
+
+
+class MenuCache:
+    """In-memory menu/settings snapshot, invalidated by every menu or settings write.
+
+    The generation number increases on each invalidation, so callers can tell
+    whether a snapshot (or anything derived from it) is stale by comparing ints.
+    It only counts this process's invalidations; the menu_version stored in the
+    database is the counter shared by every process. Writes made by this
+    process invalidate directly; writes from any other process are caught by
+    comparing the snapshot's menu_version with the database's, at most every
+    MENU_RECHECK_SECONDS: after another connection commits (every checkout
+    does), even that one-row read has to refresh the connection's page cache,
+    which is too slow to pay on every call.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._snapshot: Optional[MenuSnapshot] = None
+        self._checked = 0.0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self) -> MenuSnapshot:
+        snap = self._snapshot
+        if snap is not None and snap.generation == self._generation:
+            now = time.monotonic()
+            if now - self._checked < MENU_RECHECK_SECONDS:
+                return snap
+            self._checked = now
+            if snap.version == menu_version():
+                return snap
+            self.invalidate()
+        generation = self._generation
+        snap = self._load(generation)
+        with self._lock:
+            # Only publish if no write landed while we were reading.
+            if generation == self._generation:
+                self._snapshot = snap
+        return snap
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._snapshot = None
+
+    @staticmethod
+    def _load(generation: int) -> MenuSnapshot:
+        # Read the version first: a write landing mid-load then shows up again as a change, never as a gap.
+        version = menu_version()
+        cats = list_categories()
+        items = list_items(include_unavailable=True)
+        available = [i for i in items if i["available"]]
+        return MenuSnapshot(
+            generation=generation,
+            menu=_group_menu(cats, available),
+            categories=cats,
+            items=items,
+            cafe_name=get_setting("cafe_name") or "Crispino Cafe",
+            tax_rate_percent=get_setting("tax_rate_percent") or "0",
+            printer_customer=get_setting("printer_customer") or os.environ.get("CRISPINO_PRINTER_CUSTOMER", ""),
+            printer_kitchen=get_setting("printer_kitchen") or os.environ.get("CRISPINO_PRINTER_KITCHEN", ""),
+            version=version,
+        )
+
+
+_menu_cache = MenuCache()
+
+
+def get_menu_snapshot() -> MenuSnapshot:
+    return _menu_cache.get()
+
+
+def menu_payload(snap: Optional[MenuSnapshot] = None) -> Dict[str, Any]:
+    """The whole menu for client-side rendering, including unavailable (sold out) items."""
+    snap = snap or get_menu_snapshot()
+    return {
+        "version": snap.version,
+        "full": True,
+        "settings": {"cafe_name": snap.cafe_name, "tax_rate_percent": snap.tax_rate},
+        "categories": [_menu_category(c) for c in snap.categories],
+        "items": [_menu_item(i) for i in snap.items],
+    }
+
+
+def menu_changes(since: int) -> Dict[str, Any]:
+    """Categories, items and settings changed after menu version `since`, plus deleted ids.
+
+    A `since` the database cannot answer from (0, or newer than the current
+    version, e.g. after restoring a backup) gets the full menu instead,
+    marked with "full": true.
+    """
+    conn = acquire()
+    try:
+        row = conn.execute("SELECT version, settings_version FROM menu_version WHERE id = 1").fetchone()
+        version = int(row["version"]) if row else 0
+        if since <= 0 or since > version:
+            return menu_payload()
+        changes: Dict[str, Any] = {"version": version, "full": False}
+        if int(row["settings_version"]) > since:
+            snap = get_menu_snapshot()
+            changes["settings"] = {"cafe_name": snap.cafe_name, "tax_rate_percent": snap.tax_rate}
+        changes["categories"] = [
+            _menu_category(r) for r in conn.execute("SELECT * FROM categories WHERE version > ?", (since,))
+        ]
+        changes["items"] = [_menu_item(r) for r in conn.execute("SELECT * FROM items WHERE version > ?", (since,))]
+        deleted: Dict[str, List[int]] = {"categories": [], "items": []}
+        for r in conn.execute("SELECT kind, id FROM menu_deletions WHERE version > ?", (since,)):
+            deleted["categories" if r["kind"] == "category" else "items"].append(r["id"])
+        changes["deleted"] = deleted
+        return changes
+    finally:
+        release(conn)
+
+
+def menu_generation() -> int:
+    """This process's menu cache generation; menu_version() is the cross-process counter."""
+    return _menu_cache.generation
+
+
+def invalidate_menu_cache() -> None:
+    _menu_cache.invalidate()
+
+
 @dataclass
 class Order:
     id: int
@@ -406,18 +1311,29 @@ class Order:
 
 
 def _next_order_number(conn: sqlite3.Connection) -> int:
-    row = conn.execute("SELECT value FROM settings WHERE key='order_seq'").fetchone()
-    current = int(row["value"]) if row else 1000
-    next_num = current + 1
-    conn.execute(
-        "INSERT INTO settings(key, value) VALUES('order_seq', ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
-        (str(next_num),),
+    """Allocate the next order number; caller must hold the write lock (BEGIN IMMEDIATE).
+
+    The bump rolls back with a failed checkout, so numbers stay gap-free.
+    """
+    conn.execute("UPDATE order_sequence SET value = value + 1 WHERE name = 'orders'")
+    return int(conn.execute("SELECT value FROM order_sequence WHERE name = 'orders'").fetchone()["value"])
+
+
+def _order_from_row(o: sqlite3.Row) -> Order:
+    return Order(
+        id=o["id"],
+        number=o["number"],
+        created_at=o["created_at"],
+        total_cents=o["total_cents"],
+        tax_cents=o["tax_cents"],
+        paid_cents=o["paid_cents"],
+        payment_method=o["payment_method"],
+        note=o["note"] or "",
     )
-    return next_num
 
 
 def get_order(order_id: int) -> Tuple[Order, List[sqlite3.Row]]:
-    conn = connect()
+    conn = acquire()
     try:
         o = conn.execute("SELECT * FROM orders WHERE id=?", (order_id,)).fetchone()
         if not o:
@@ -435,7 +1351,27 @@ def get_order(order_id: int) -> Tuple[Order, List[sqlite3.Row]]:
         )
         return order, items
     finally:
-        conn.close()
+        release(conn)
+
+
+def get_orders(order_ids: List[int]) -> Dict[int, Tuple[Order, List[sqlite3.Row]]]:
+    """Load several orders and their lines in two queries, keyed by order id."""
+    if not order_ids:
+        return {}
+    placeholders = ",".join("?" for _ in order_ids)
+    conn = acquire()
+    try:
+        result: Dict[int, Tuple[Order, List[sqlite3.Row]]] = {}
+        for o in conn.execute(f"SELECT * FROM orders WHERE id IN ({placeholders})", order_ids):
+            result[o["id"]] = (_order_from_row(o), [])
+        lines = conn.execute(
+            f"SELECT * FROM order_items WHERE order_id IN ({placeholders}) ORDER BY order_id, id", order_ids
+        )
+        for line in lines:
+            result[line["order_id"]][1].append(line)
+        return result
+    finally:
+        release(conn)
 
 
 def _lookup_items(item_quantities: Dict[int, int], conn: sqlite3.Connection) -> List[sqlite3.Row]:
@@ -447,61 +1383,629 @@ def _lookup_items(item_quantities: Dict[int, int], conn: sqlite3.Connection) ->
     return list(conn.execute(sql, ids))
 
 
+# --- Receipts ---
+# Orders never change once written, so their printouts are rendered once (at
+# checkout, or on the first print) and served from memory afterwards.
+
+RECEIPT_CACHE_SIZE = int(os.environ.get("CRISPINO_RECEIPT_CACHE_SIZE", "512"))
+ESCPOS_COLUMNS = int(os.environ.get("CRISPINO_ESCPOS_COLUMNS", "48"))  # 48 for 80mm paper, 32 for 58mm
+ESCPOS_ENCODING = "cp437"
+
+_ESC, _GS = b"\x1b", b"\x1d"
+_ESCPOS_INIT = _ESC + b"@"
+_ESCPOS_LEFT, _ESCPOS_CENTER = _ESC + b"a\x00", _ESC + b"a\x01"
+_ESCPOS_BOLD_ON, _ESCPOS_BOLD_OFF = _ESC + b"E\x01", _ESC + b"E\x00"
+_ESCPOS_DOUBLE, _ESCPOS_NORMAL = _GS + b"!\x11", _GS + b"!\x00"
+_ESCPOS_FEED_CUT = b"\n\n\n" + _GS + b"V\x42\x00"
+
+
+@dataclass(frozen=True)
+class Receipt:
+    """Pre-rendered printouts of one order."""
+
+    order_id: int
+    number: int
+    customer_html: str
+    kitchen_html: str
+    customer_escpos: bytes
+    kitchen_escpos: bytes
+
+
+class ReceiptCache:
+    """Bounded LRU of rendered receipts keyed by order id."""
+
+    def __init__(self, capacity: int = RECEIPT_CACHE_SIZE) -> None:
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._receipts: "OrderedDict[int, Receipt]" = OrderedDict()
+
+    def get(self, order_id: int) -> Optional[Receipt]:
+        with self._lock:
+            receipt = self._receipts.get(order_id)
+            if receipt is not None:
+                self._receipts.move_to_end(order_id)
+        receipt_lookups.inc("hit" if receipt is not None else "miss")
+        return receipt
+
+    def put(self, receipt: Receipt) -> None:
+        with self._lock:
+            self._receipts[receipt.order_id] = receipt
+            self._receipts.move_to_end(receipt.order_id)
+            while len(self._receipts) > self.capacity:
+                self._receipts.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._receipts)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._receipts.clear()
+
+
+receipt_lookups = Counter("crispino_receipt_cache_lookups_total", "Receipt cache lookups by result", ("result",))
+receipt_cache = ReceiptCache()
+Gauge("crispino_receipt_cache_entries", "Rendered receipts held in memory", lambda: len(receipt_cache))
+
+
+def _escpos_row(left: str, right: str, columns: int) -> str:
+    room = max(1, columns - len(right) - 1)
+    return f"{left[:room]:<{room}} {right}"
+
+
+def render_escpos(order: Order, items: List[Any], cafe_name: str, kitchen: bool = False, columns: int = ESCPOS_COLUMNS) -> bytes:
+    """ESC/POS byte stream for a thermal printer; mirrors print_customer/print_kitchen.html."""
+    out = bytearray(_ESCPOS_INIT)
+
+    def text(line: str = "") -> None:
+        out.extend(line.encode(ESCPOS_ENCODING, "replace") + b"\n")
+
+    rule = "-" * columns
+    out += _ESCPOS_CENTER + _ESCPOS_BOLD_ON
+    text(cafe_name)
+    out += _ESCPOS_BOLD_OFF
+    if kitchen:
+        out += _ESCPOS_DOUBLE
+    text(f"Order #{order.number}")
+    out += _ESCPOS_NORMAL
+    text(order.created_at)
+    out += _ESCPOS_LEFT
+    text(rule)
+    for it in items:
+        if kitchen:
+            out += _ESCPOS_DOUBLE
+            text(f"{it['qty']} x {it['name']}")
+            out += _ESCPOS_NORMAL
+        else:
+            text(_escpos_row(f"{it['qty']} x {it['name']}", f"Rs {it['unit_price_cents'] * it['qty'] / 100:.2f}", columns))
+    text(rule)
+    if kitchen:
+        text(f"Note: {order.note}")
+    else:
+        text(_escpos_row("Tax", f"Rs {order.tax_cents / 100:.2f}", columns))
+        out += _ESCPOS_BOLD_ON
+        text(_escpos_row("Total", f"Rs {order.total_cents / 100:.2f}", columns))
+        out += _ESCPOS_BOLD_OFF
+        if order.payment_method == "cash":
+            text(f"Paid: Rs {order.paid_cents / 100:.2f}")
+            text(f"Change: Rs {(order.paid_cents - order.total_cents) / 100:.2f}")
+        else:
+            text(f"Payment: {order.payment_method.capitalize()}")
+        if order.note:
+            text(rule)
+            text(f"Note: {order.note}")
+        text(rule)
+        out += _ESCPOS_CENTER
+        text("Thank you!")
+    out += _ESCPOS_FEED_CUT
+    return bytes(out)
+
+
+KITCHEN_FEED_BACKLOG = 500
+
+
+class KitchenFeed:
+    """In-process fan-out of new orders to kitchen display streams.
+
+    Checkout publishes each committed order as a kitchen ticket whose event id
+    is the order id. The last KITCHEN_FEED_BACKLOG tickets stay in memory, so
+    subscribers (and reconnects with a Last-Event-ID) are served without
+    touching the database.
+    """
+
+    def __init__(self, backlog: int = KITCHEN_FEED_BACKLOG) -> None:
+        self._lock = threading.Lock()
+        self._tickets: deque = deque(maxlen=backlog)
+        self._subscribers: List[Callable[[], None]] = []
+
+    def publish(self, tickets: List[Dict[str, Any]]) -> None:
+        if not tickets:
+            return
+        with self._lock:
+            self._tickets.extend(tickets)
+            subscribers = list(self._subscribers)
+        for notify in subscribers:
+            notify()
+
+    def subscribe(self, notify: Callable[[], None]) -> Callable[[], None]:
+        """Call notify() after every publish; returns the unsubscribe function."""
+        with self._lock:
+            self._subscribers.append(notify)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if notify in self._subscribers:
+                    self._subscribers.remove(notify)
+
+        return unsubscribe
+
+    @property
+    def last_event_id(self) -> int:
+        with self._lock:
+            return self._tickets[-1]["id"] if self._tickets else 0
+
+    def recent(self, count: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._tickets)[-count:] if count > 0 else []
+
+    def since(self, last_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Tickets after last_id, or None when the backlog cannot vouch for them.
+
+        An empty backlog (e.g. just after a restart) also returns None: the
+        caller may have missed orders this process never saw.
+        """
+        with self._lock:
+            if not self._tickets or last_id < self._tickets[0]["id"] - 1:
+                return None
+            if last_id >= self._tickets[-1]["id"]:
+                return []
+            return [t for t in self._tickets if t["id"] > last_id]
+
+
+kitchen_feed = KitchenFeed()
+
+
+def _kitchen_ticket(order_id: int, number: int, created_at: str, note: str, lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "id": order_id,
+        "number": number,
+        "created_at": created_at,
+        "note": note,
+        "items": [{"name": l["name"], "qty": l["qty"], "category_name": l["category_name"]} for l in lines],
+    }
+
+
+def kitchen_backlog(limit: int) -> Tuple[int, List[Dict[str, Any]]]:
+    """(newest order id, its last `limit` tickets) straight from the DB, for streams on an empty feed."""
+    conn = acquire()
+    try:
+        row = conn.execute(
+            "SELECT MAX(id) AS last, MIN(id) AS first FROM (SELECT id FROM orders ORDER BY id DESC LIMIT ?)",
+            (max(limit, 1),),
+        ).fetchone()
+    finally:
+        release(conn)
+    if row["last"] is None:
+        return 0, []
+    tickets = kitchen_tickets_after(row["first"] - 1, limit) if limit > 0 else []
+    return int(row["last"]), [t for t in tickets if t["id"] <= row["last"]]
+
+
+def kitchen_tickets_after(after_id: int, limit: int = KITCHEN_FEED_BACKLOG) -> List[Dict[str, Any]]:
+    """Rebuild kitchen tickets from the orders table (reconnects older than the feed backlog)."""
+    page = export_orders_after(after_id, limit)
+    return [
+        _kitchen_ticket(o["id"], o["number"], o["created_at"], o["note"] or "", o["items"])
+        for o in page["orders"]
+    ]
+
+
+KITCHEN_POLL_SECONDS = 1.0
+
+
+class KitchenPoller:
+    """Fills kitchen_feed from the orders table on multi-worker servers.
+
+    Each worker process only sees its own checkouts, so with SERVER_WORKERS > 1
+    checkouts wake this thread instead of publishing, and it reads every order
+    after its cursor (at once, or every KITCHEN_POLL_SECONDS for the other
+    workers' orders) and publishes them in id order. Kitchen streams stay on
+    the in-memory feed, so polling costs one indexed query per worker per
+    interval however many screens are open.
+    """
+
+    def __init__(self, interval: float = KITCHEN_POLL_SECONDS) -> None:
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_id = 0
+
+    @property
+    def enabled(self) -> bool:
+        return SERVER_WORKERS > 1
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def run_once(self) -> int:
+        """Publish the orders committed since the last poll; returns how many."""
+        count = 0
+        while True:
+            tickets = kitchen_tickets_after(self._last_id)
+            if tickets:
+                self._last_id = tickets[-1]["id"]
+                kitchen_feed.publish(tickets)
+                count += len(tickets)
+            if len(tickets) < KITCHEN_FEED_BACKLOG:
+                return count
+
+    def _loop(self) -> None:
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.run_once()
+            except sqlite3.Error:  # busy or locked: try again on the next wake-up
+                pass
+
+    def start(self) -> None:
+        if not self.enabled or self._thread is not None:
+            return
+        # Streams seed a fresh connection from the DB, so only newer orders need importing.
+        self._last_id = kitchen_backlog(0)[0]
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="crispino-kitchen", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+kitchen_poller = KitchenPoller()
+
+
+def _publish_kitchen(tickets: List[Dict[str, Any]]) -> None:
+    if kitchen_poller.enabled:
+        kitchen_poller.wake()
+    else:
+        kitchen_feed.publish(tickets)
+
+
+_checkout_lock = threading.Lock()
+IDEMPOTENCY_KEY_MAX_LEN = 100
+
+
+@contextmanager
+def _checkout_locked() -> Iterator[None]:
+    with checkout_lock_wait.time():
+        _checkout_lock.acquire()
+    try:
+        yield
+    finally:
+        _checkout_lock.release()
+
+
+def _begin_immediate(conn: sqlite3.Connection, caller: str) -> None:
+    # Take the write lock up front: concurrent writers queue on busy_timeout
+    # instead of failing a read->write lock upgrade with "database is locked".
+    with write_lock_wait.time(caller):
+        conn.execute("BEGIN IMMEDIATE")
+
+
+def _cart_quantities(cart_lines: List[Dict[str, Any]]) -> Dict[int, int]:
+    item_quantities: Dict[int, int] = {}
+    for line in cart_lines:
+        iid = int(line["item_id"])
+        qty = int(line["qty"])
+        if qty <= 0:
+            continue
+        item_quantities[iid] = item_quantities.get(iid, 0) + qty
+
+    if not item_quantities:
+        raise ValueError("Cart is empty")
+    return item_quantities
+
+
+def _clean_idempotency_key(idempotency_key: Optional[str]) -> Optional[str]:
+    idempotency_key = (idempotency_key or "").strip() or None
+    if idempotency_key is not None and len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LEN:
+        raise ValueError("Idempotency key is too long")
+    return idempotency_key
+
+
+def _insert_order(
+    conn: sqlite3.Connection,
+    item_quantities: Dict[int, int],
+    payment_method: str,
+    cash_received_cents: int,
+    note: str,
+    idempotency_key: Optional[str],
+    tax_rate_percent: float,
+    created_at: Optional[str] = None,
+    tickets: Optional[List[Dict[str, Any]]] = None,
+) -> Tuple[int, int]:
+    """Write one order; the caller holds the write transaction.
+
+    New orders are appended to `tickets` for the caller to publish on the
+    kitchen feed once the transaction has committed.
+    """
+    if idempotency_key is not None:
+        prior = conn.execute(
+            "SELECT id, number FROM orders WHERE idempotency_key=?", (idempotency_key,)
+        ).fetchone()
+        if prior:
+            return int(prior["id"]), int(prior["number"])
+
+    rows = _lookup_items(item_quantities, conn)
+    if not rows:
+        raise ValueError("No valid items in cart")
+
+    lines = [
+        (int(r["id"]), r["name"], int(r["price_cents"]), item_quantities[int(r["id"])], r["category_name"])
+        for r in rows
+    ]
+    subtotal = sum(price * qty for _, _, price, qty, _ in lines)
+    tax_cents = round(subtotal * tax_rate_percent / 100.0)
+    total_cents = subtotal + tax_cents
+
+    order_number = _next_order_number(conn)
+    created = created_at or now_iso()
+
+    cur = conn.execute(
+        "INSERT INTO orders(number, created_at, total_cents, tax_cents, paid_cents, payment_method, note, idempotency_key) VALUES(?,?,?,?,?,?,?,?)",
+        (order_number, created, total_cents, tax_cents, cash_received_cents, payment_method, note, idempotency_key),
+    )
+    order_id = int(cur.lastrowid)
+
+    conn.executemany(
+        "INSERT INTO order_items(order_id, item_id, name, unit_price_cents, qty, category_name) VALUES(?,?,?,?,?,?)",
+        [(order_id, iid, name, price, qty, cat) for iid, name, price, qty, cat in lines],
+    )
+
+    if _order_fts_enabled(conn):
+        conn.execute(
+            "INSERT INTO orders_fts(rowid, number, note, items) VALUES(?,?,?,?)",
+            (order_id, str(order_number), note or "", " ".join(name for _, name, _, _, _ in lines)),
+        )
+
+    _record_sale(
+        conn,
+        created,
+        payment_method,
+        total_cents,
+        tax_cents,
+        [(name, cat, qty, price) for _, name, price, qty, cat in lines],
+    )
+    if tickets is not None:
+        tickets.append(_kitchen_ticket(
+            order_id,
+            order_number,
+            created,
+            note or "",
+            [{"name": name, "qty": qty, "category_name": cat} for _, name, _, qty, cat in lines],
+        ))
+    return order_id, order_number
+
+
 def create_order_from_cart(
     cart_lines: List[Dict[str, Any]],
     payment_method: str,
     cash_received_cents: int,
     note: str,
-) -> int:
-    conn = connect()
+    idempotency_key: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Place an order in a single write transaction. Returns (order_id, order_number).
+
+    A repeated idempotency_key returns the order it first created instead of
+    inserting a duplicate (client retries after a network hiccup).
+    """
+    idempotency_key = _clean_idempotency_key(idempotency_key)
+    item_quantities = _cart_quantities(cart_lines)
+
+    # Served from the menu cache; invalidated whenever the setting changes.
+    tax_rate_percent = get_menu_snapshot().tax_rate
+
+    tickets: List[Dict[str, Any]] = []
+    conn = acquire()
     try:
-        with conn:
-            item_quantities: Dict[int, int] = {}
-            for line in cart_lines:
-                iid = int(line["item_id"])
-                qty = int(line["qty"])
-                if qty <= 0:
-                    continue
-                item_quantities[iid] = item_quantities.get(iid, 0) + qty
-
-            if not item_quantities:
-                raise ValueError("Cart is empty")
-
-            rows = _lookup_items(item_quantities, conn)
-            if not rows:
-                raise ValueError("No valid items in cart")
-
-            tax_rate_percent = float(get_setting("tax_rate_percent", conn=conn) or "0")
-            subtotal = 0
-            for r in rows:
-                subtotal += int(r["price_cents"]) * item_quantities[int(r["id"])]
-            tax_cents = round(subtotal * tax_rate_percent / 100.0)
-            total_cents = subtotal + tax_cents
-
-            order_number = _next_order_number(conn)
-            created = now_iso()
-
-            cur = conn.execute(
-                "INSERT INTO orders(number, created_at, total_cents, tax_cents, paid_cents, payment_method, note) VALUES(?,?,?,?,?,?,?)",
-                (order_number, created, total_cents, tax_cents, cash_received_cents, payment_method, note),
-            )
-            order_id = int(cur.lastrowid)
-
-            for r in rows:
-                iid = int(r["id"])
-                qty = item_quantities[iid]
-                conn.execute(
-                    "INSERT INTO order_items(order_id, item_id, name, unit_price_cents, qty, category_name) VALUES(?,?,?,?,?,?)",
-                    (order_id, iid, r["name"], int(r["price_cents"]), qty, r["category_name"]),
+        # Checkouts in this process queue on a plain mutex, which wakes waiters
+        # immediately; SQLite's busy handler backs off in sleeps of up to 100ms.
+        with _checkout_locked():
+            with conn:
+                _begin_immediate(conn, "checkout")
+                created = _insert_order(
+                    conn, item_quantities, payment_method, cash_received_cents, note, idempotency_key,
+                    tax_rate_percent, tickets=tickets,
                 )
-            return order_id
+            # Publish after commit but under the lock, so tickets reach the feed in id order.
+            _publish_kitchen(tickets)
+            return created
     finally:
-        conn.close()
+        release(conn)
+
+
+def _clean_created_at(value: Optional[str]) -> Optional[str]:
+    """Normalise a client-side order time (tills that sold offline); never later than now."""
+    if value is None or not str(value).strip():
+        return None
+    try:
+        when = datetime.fromisoformat(str(value).strip().replace("T", " "))
+    except ValueError:
+        raise ValueError("Invalid created_at")
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    return min(when.replace(microsecond=0), datetime.now().replace(microsecond=0)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_orders(orders: List[Dict[str, Any]]) -> List[Tuple[Optional[Tuple[int, int]], Optional[str]]]:
+    """Place a batch of orders in one write transaction.
+
+    Each entry has the create_order_from_cart arguments as keys (cart_lines,
+    payment_method, cash_received_cents, note, idempotency_key) plus an optional
+    created_at for orders taken while the till was offline. Every order runs
+    in its own savepoint, so one invalid order does not sink the rest. Returns
+    ((order_id, order_number), None) or (None, error) per entry, in order.
+    """
+    tax_rate_percent = get_menu_snapshot().tax_rate
+    results: List[Tuple[Optional[Tuple[int, int]], Optional[str]]] = []
+    tickets: List[Dict[str, Any]] = []
+    conn = acquire()
+    try:
+        with _checkout_locked():
+            with conn:
+                _begin_immediate(conn, "batch")
+                for spec in orders:
+                    conn.execute("SAVEPOINT batch_order")
+                    try:
+                        created = _insert_order(
+                            conn,
+                            _cart_quantities(spec["cart_lines"]),
+                            spec.get("payment_method", "cash"),
+                            int(spec.get("cash_received_cents", 0)),
+                            spec.get("note", "") or "",
+                            _clean_idempotency_key(spec.get("idempotency_key")),
+                            tax_rate_percent,
+                            _clean_created_at(spec.get("created_at")),
+                            tickets=tickets,
+                        )
+                    except (ValueError, KeyError, TypeError, sqlite3.IntegrityError) as e:
+                        conn.execute("ROLLBACK TO batch_order")
+                        conn.execute("RELEASE batch_order")
+                        results.append((None, str(e)))
+                        continue
+                    conn.execute("RELEASE batch_order")
+                    results.append((created, None))
+            _publish_kitchen(tickets)
+        return results
+    finally:
+        release(conn)
+
+
+def _record_sale(
+    conn: sqlite3.Connection,
+    created_at: str,
+    payment_method: str,
+    total_cents: int,
+    tax_cents: int,
+    lines: List[Tuple[str, str, int, int]],
+) -> None:
+    """Add one order to the sales rollups; runs inside the checkout transaction."""
+    day, hour = created_at[:10], int(created_at[11:13])
+    conn.executemany(
+        """INSERT INTO sales_daily_item(day, item_name, category_name, qty, revenue_cents, order_count)
+           VALUES(?,?,?,?,?,1)
+           ON CONFLICT(day, item_name, category_name) DO UPDATE SET
+               qty=qty+excluded.qty, revenue_cents=revenue_cents+excluded.revenue_cents, order_count=order_count+1""",
+        [(day, name, cat, qty, qty * price) for name, cat, qty, price in lines],
+    )
+    conn.execute(
+        """INSERT INTO sales_daily_payment(day, payment_method, order_count, total_cents, tax_cents)
+           VALUES(?,?,1,?,?)
+           ON CONFLICT(day, payment_method) DO UPDATE SET
+               order_count=order_count+1, total_cents=total_cents+excluded.total_cents,
+               tax_cents=tax_cents+excluded.tax_cents""",
+        (day, payment_method, total_cents, tax_cents),
+    )
+    conn.execute(
+        """INSERT INTO sales_hourly(day, hour, order_count, total_cents) VALUES(?,?,1,?)
+           ON CONFLICT(day, hour) DO UPDATE SET
+               order_count=order_count+1, total_cents=total_cents+excluded.total_cents""",
+        (day, hour, total_cents),
+    )
+
+
+def _rebuild_rollups(conn: sqlite3.Connection) -> None:
+    conn.execute("DELETE FROM sales_daily_item")
+    conn.execute("DELETE FROM sales_daily_payment")
+    conn.execute("DELETE FROM sales_hourly")
+    conn.execute(
+        """INSERT INTO sales_daily_item(day, item_name, category_name, qty, revenue_cents, order_count)
+           SELECT substr(o.created_at, 1, 10), oi.name, oi.category_name,
+                  SUM(oi.qty), SUM(oi.qty * oi.unit_price_cents), COUNT(DISTINCT o.id)
+           FROM order_items oi JOIN orders o ON oi.order_id = o.id
+           GROUP BY 1, 2, 3"""
+    )
+    conn.execute(
+        """INSERT INTO sales_daily_payment(day, payment_method, order_count, total_cents, tax_cents)
+           SELECT substr(created_at, 1, 10), payment_method, COUNT(*), SUM(total_cents), SUM(tax_cents)
+           FROM orders GROUP BY 1, 2"""
+    )
+    conn.execute(
+        """INSERT INTO sales_hourly(day, hour, order_count, total_cents)
+           SELECT substr(created_at, 1, 10), CAST(substr(created_at, 12, 2) AS INTEGER), COUNT(*), SUM(total_cents)
+           FROM orders GROUP BY 1, 2"""
+    )
+
+
+def backfill_rollups() -> None:
+    """Rebuild the sales rollup tables from the full order history (maintenance)."""
+    conn = acquire()
+    try:
+        with conn:
+            _rebuild_rollups(conn)
+    finally:
+        release(conn)
+
+
+def rebuild_order_search() -> bool:
+    """Rebuild the order search index from the orders table (maintenance). False without FTS5."""
+    conn = acquire()
+    try:
+        if not _order_fts_enabled(conn):
+            return False
+        with conn:
+            _rebuild_order_fts(conn)
+        return True
+    finally:
+        release(conn)
+
+
+def renumber_sort_order() -> int:
+    """Compact category and per-category item sort_order to 1..N, keeping IDs stable.
+
+    Only rows whose position actually changed are written; order_items is never
+    touched. Returns the number of rows updated.
+    """
+    conn = acquire()
+    try:
+        with conn:
+            cat_rows = list(conn.execute("SELECT id, sort_order FROM categories ORDER BY sort_order, name, id"))
+            cat_updates = [
+                (pos, r["id"]) for pos, r in enumerate(cat_rows, start=1) if r["sort_order"] != pos
+            ]
+            item_updates: List[Tuple[int, int]] = []
+            pos = 0
+            prev_cat: Optional[int] = None
+            for r in conn.execute("SELECT id, category_id, sort_order FROM items ORDER BY category_id, sort_order, name, id"):
+                pos = pos + 1 if r["category_id"] == prev_cat else 1
+                prev_cat = r["category_id"]
+                if r["sort_order"] != pos:
+                    item_updates.append((pos, r["id"]))
+            if cat_updates:
+                conn.executemany("UPDATE categories SET sort_order=? WHERE id=?", cat_updates)
+            if item_updates:
+                conn.executemany("UPDATE items SET sort_order=? WHERE id=?", item_updates)
+        changed = len(cat_updates) + len(item_updates)
+        if changed:
+            invalidate_menu_cache()
+        return changed
+    finally:
+        release(conn)
 
 
 def renumber_categories_and_items() -> None:
-    """Renumber categories 1..N and items 1..N by current order; update references."""
-    conn = connect()
+    """Renumber categories 1..N and items 1..N by current order; update references.
+
+    Offline maintenance only (scripts/maintenance.py renumber-ids): this rebuilds both
+    tables and rewrites order_items.item_id, so run it with the server stopped.
+    """
+    conn = acquire()
     try:
         with conn:
             cur = conn.cursor()
@@ -512,7 +2016,7 @@ def renumber_categories_and_items() -> None:
             cat_map = {r["id"]: idx + 1 for idx, r in enumerate(cat_rows)}
             if any(old != new for old, new in cat_map.items()):
                 cur.execute(
-                    "CREATE TABLE categories_new (id INTEGER PRIMARY KEY, name TEXT NOT NULL, sort_order INTEGER NOT NULL DEFAULT 0)"
+                    "CREATE TABLE categories_new (id INTEGER PRIMARY KEY, name TEXT NOT NULL, sort_order INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL DEFAULT 1)"
                 )
                 for r in cat_rows:
                     new_id = cat_map[r["id"]]
@@ -525,6 +2029,9 @@ def renumber_categories_and_items() -> None:
                         cur.execute("UPDATE items SET category_id=? WHERE category_id=?", (new_id, old_id))
                 cur.execute("DROP TABLE categories")
                 cur.execute("ALTER TABLE categories_new RENAME TO categories")
+                cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_categories_name_nocase ON categories(lower(name))")
+                _create_menu_version_triggers(conn)
+                _touch_menu_table(conn, "categories", "category", cat_map)
 
             # Items
             item_rows = list(
@@ -538,7 +2045,7 @@ def renumber_categories_and_items() -> None:
             item_map = {r["id"]: idx + 1 for idx, r in enumerate(item_rows)}
             if any(old != new for old, new in item_map.items()):
                 cur.execute(
-                    "CREATE TABLE items_new (id INTEGER PRIMARY KEY, name TEXT NOT NULL, price_cents INTEGER NOT NULL, category_id INTEGER NOT NULL, available INTEGER NOT NULL DEFAULT 1, sort_order INTEGER NOT NULL DEFAULT 0)"
+                    "CREATE TABLE items_new (id INTEGER PRIMARY KEY, name TEXT NOT NULL, price_cents INTEGER NOT NULL, category_id INTEGER NOT NULL, available INTEGER NOT NULL DEFAULT 1, sort_order INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL DEFAULT 1)"
                 )
                 for r in item_rows:
                     new_id = item_map[r["id"]]
@@ -551,27 +2058,79 @@ def renumber_categories_and_items() -> None:
                         cur.execute("UPDATE order_items SET item_id=? WHERE item_id=?", (new_id, old_id))
                 cur.execute("DROP TABLE items")
                 cur.execute("ALTER TABLE items_new RENAME TO items")
+                # Rebuilt table lost its indexes; restore them.
+                cur.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS ux_items_cat_name_nocase ON items(category_id, lower(name))"
+                )
+                cur.execute("CREATE INDEX IF NOT EXISTS ix_items_category_sort ON items(category_id, sort_order)")
+                _create_menu_version_triggers(conn)
+                _touch_menu_table(conn, "items", "item", item_map)
+        invalidate_menu_cache()
     finally:
-        conn.close()
+        release(conn)
 
 
-def get_recent_orders(limit: int = 10) -> List[sqlite3.Row]:
-    """Get recent orders for order history."""
-    conn = connect()
+# Per-order line summary, evaluated only for the rows a query actually returns.
+_ORDER_SUMMARY_COLUMNS = """
+    (SELECT COUNT(*) FROM order_items oi WHERE oi.order_id = o.id) AS item_count,
+    (SELECT GROUP_CONCAT(oi.name || ' x' || oi.qty, ', ') FROM order_items oi WHERE oi.order_id = o.id) AS items_summary
+"""
+
+
+ORDER_PAGE_MAX_LIMIT = 200
+
+
+def list_orders_page(
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    *,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    payment_method: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Newest-first page of orders using keyset pagination on orders.id.
+
+    Pass the returned next_before_id as before_id for the next (older) page; it is
+    None on the last page. Dates are inclusive YYYY-MM-DD bounds.
+    """
+    limit = max(1, min(int(limit), ORDER_PAGE_MAX_LIMIT))
+    where: List[str] = []
+    params: List[Any] = []
+    if before_id is not None:
+        where.append("o.id < ?")
+        params.append(before_id)
+    if date_from:
+        where.append("o.created_at >= ?")
+        params.append(_day_bounds(date_from)[0])
+    if date_to:
+        where.append("o.created_at < ?")
+        params.append(_day_bounds(date_to)[1])
+    if payment_method:
+        where.append("o.payment_method = ?")
+        params.append(payment_method)
+    # Limit first, then summarise only the page.
+    sql = f"""
+        SELECT o.*, {_ORDER_SUMMARY_COLUMNS}
+        FROM (
+            SELECT * FROM orders o {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY o.id DESC LIMIT ?
+        ) o
+        ORDER BY o.id DESC
+    """
+    params.append(limit + 1)
+    conn = acquire()
     try:
-        sql = """
-            SELECT o.*, 
-                   COUNT(oi.id) as item_count,
-                   GROUP_CONCAT(oi.name || ' x' || oi.qty, ', ') as items_summary
-            FROM orders o
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            GROUP BY o.id
-            ORDER BY o.created_at DESC
-            LIMIT ?
-        """
-        return list(conn.execute(sql, (limit,)))
+        rows = list(conn.execute(sql, params))
     finally:
-        conn.close()
+        release(conn)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {"orders": rows, "next_before_id": rows[-1]["id"] if has_more else None}
+
+
+def get_recent_orders(limit: int = 10) -> List[sqlite3.Row]:
+    """Get recent orders for order history."""
+    return list_orders_page(limit=limit)["orders"]
 
 
 def get_daily_report(date: str = None) -> Dict[str, Any]:
@@ -579,55 +2138,93 @@ def get_daily_report(date: str = None) -> Dict[str, Any]:
     if date is None:
         date = datetime.now().strftime("%Y-%m-%d")
     
-    conn = connect()
+    conn = acquire()
     try:
+        start, end = _day_bounds(date)
+
         # Get orders for the day
         orders = list(conn.execute(
-            "SELECT * FROM orders WHERE DATE(created_at) = ? ORDER BY created_at",
-            (date,)
+            "SELECT * FROM orders WHERE created_at >= ? AND created_at < ? ORDER BY created_at",
+            (start, end)
         ))
         
-        # Get item sales for the day
+        # Item sales, totals and payment breakdown come from the rollups
         item_sales = list(conn.execute(
             """
-            SELECT oi.name, oi.category_name, SUM(oi.qty) as total_qty, 
-                   SUM(oi.qty * oi.unit_price_cents) as total_revenue
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            WHERE DATE(o.created_at) = ?
-            GROUP BY oi.name, oi.category_name
+            SELECT item_name AS name, category_name, qty AS total_qty, revenue_cents AS total_revenue
+            FROM sales_daily_item
+            WHERE day = ?
             ORDER BY total_revenue DESC
             """,
-            (date,)
+            (start,)
+        ))
+        payments = list(conn.execute(
+            "SELECT payment_method, order_count, total_cents, tax_cents FROM sales_daily_payment WHERE day = ?",
+            (start,)
+        ))
+        hourly = list(conn.execute(
+            "SELECT hour, order_count, total_cents FROM sales_hourly WHERE day = ? ORDER BY hour",
+            (start,)
         ))
-        
-        # Calculate totals
-        total_orders = len(orders)
-        total_revenue = sum(o["total_cents"] for o in orders)
-        total_tax = sum(o["tax_cents"] for o in orders)
-        
-        # Payment method breakdown
-        payment_methods = {}
-        for order in orders:
-            method = order["payment_method"]
-            payment_methods[method] = payment_methods.get(method, 0) + order["total_cents"]
         
         return {
             "date": date,
-            "total_orders": total_orders,
-            "total_revenue_cents": total_revenue,
-            "total_tax_cents": total_tax,
+            "total_orders": sum(p["order_count"] for p in payments),
+            "total_revenue_cents": sum(p["total_cents"] for p in payments),
+            "total_tax_cents": sum(p["tax_cents"] for p in payments),
             "orders": orders,
             "item_sales": item_sales,
-            "payment_methods": payment_methods
+            "payment_methods": {p["payment_method"]: p["total_cents"] for p in payments},
+            "hourly": [dict(h) for h in hourly],
         }
     finally:
-        conn.close()
+        release(conn)
+
+
+# group_by -> aggregate over the rollup tables; each report is a single SQL pass.
+_RANGE_REPORT_SQL: Dict[str, str] = {
+    "day": """SELECT day AS bucket, SUM(order_count) AS order_count, SUM(total_cents) AS total_cents,
+                     SUM(tax_cents) AS tax_cents
+              FROM sales_daily_payment WHERE day >= ? AND day <= ? GROUP BY 1 ORDER BY 1""",
+    "week": """SELECT date(day, 'weekday 0', '-6 days') AS bucket, SUM(order_count) AS order_count,
+                      SUM(total_cents) AS total_cents, SUM(tax_cents) AS tax_cents
+               FROM sales_daily_payment WHERE day >= ? AND day <= ? GROUP BY 1 ORDER BY 1""",
+    "month": """SELECT substr(day, 1, 7) AS bucket, SUM(order_count) AS order_count,
+                       SUM(total_cents) AS total_cents, SUM(tax_cents) AS tax_cents
+                FROM sales_daily_payment WHERE day >= ? AND day <= ? GROUP BY 1 ORDER BY 1""",
+    "payment_method": """SELECT payment_method AS bucket, SUM(order_count) AS order_count,
+                                SUM(total_cents) AS total_cents, SUM(tax_cents) AS tax_cents
+                         FROM sales_daily_payment WHERE day >= ? AND day <= ? GROUP BY 1 ORDER BY 3 DESC""",
+    "hour": """SELECT hour AS bucket, SUM(order_count) AS order_count, SUM(total_cents) AS total_cents
+               FROM sales_hourly WHERE day >= ? AND day <= ? GROUP BY 1 ORDER BY 1""",
+    "category": """SELECT category_name AS bucket, SUM(qty) AS qty, SUM(revenue_cents) AS revenue_cents
+                   FROM sales_daily_item WHERE day >= ? AND day <= ? GROUP BY 1 ORDER BY 3 DESC""",
+    "item": """SELECT item_name AS bucket, category_name, SUM(qty) AS qty, SUM(revenue_cents) AS revenue_cents,
+                      SUM(order_count) AS order_count
+               FROM sales_daily_item WHERE day >= ? AND day <= ? GROUP BY 1, 2 ORDER BY 4 DESC""",
+}
+
+RANGE_GROUP_BY = tuple(_RANGE_REPORT_SQL)
+
+
+def get_range_report(date_from: str, date_to: str, group_by: str = "day") -> List[Dict[str, Any]]:
+    """Aggregate sales between two dates (inclusive, YYYY-MM-DD) into buckets, from the rollups."""
+    if group_by not in _RANGE_REPORT_SQL:
+        raise ValueError(f"Unsupported group_by: {group_by} (expected one of {', '.join(RANGE_GROUP_BY)})")
+    start, _ = _day_bounds(date_from)
+    end, _ = _day_bounds(date_to)
+    if end < start:
+        raise ValueError("'to' must not be before 'from'")
+    conn = acquire()
+    try:
+        return [dict(r) for r in conn.execute(_RANGE_REPORT_SQL[group_by], (start, end))]
+    finally:
+        release(conn)
 
 
 def get_order_by_number(order_number: int) -> Optional[Tuple[Order, List[sqlite3.Row]]]:
     """Get order by order number instead of ID."""
-    conn = connect()
+    conn = acquire()
     try:
         o = conn.execute("SELECT * FROM orders WHERE number=?", (order_number,)).fetchone()
         if not o:
@@ -645,104 +2242,675 @@ def get_order_by_number(order_number: int) -> Optional[Tuple[Order, List[sqlite3
         )
         return order, items
     finally:
-        conn.close()
+        release(conn)
+
+
+_order_fts: Optional[bool] = None
+
+
+def _order_fts_enabled(conn: sqlite3.Connection) -> bool:
+    global _order_fts
+    if _order_fts is None:
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='orders_fts'").fetchone()
+        _order_fts = row is not None
+    return _order_fts
+
+
+def _fts_prefix_query(query: str) -> str:
+    """User text -> FTS5 query: every word must match as a prefix."""
+    words = re.findall(r"\w+", query)
+    return " ".join('"%s"*' % w for w in words)
 
 
 def search_orders(query: str, limit: int = 20) -> List[sqlite3.Row]:
-    """Search orders by order number, customer note, or item names."""
-    conn = connect()
+    """Search orders by order number, customer note, or item names.
+
+    An exact order number comes first (via the orders.number unique index),
+    followed by full-text prefix matches ranked by relevance.
+    """
+    query = (query or "").strip()
+    conn = acquire()
     try:
-        sql = """
-            SELECT DISTINCT o.*, 
-                   COUNT(oi.id) as item_count,
-                   GROUP_CONCAT(oi.name || ' x' || oi.qty, ', ') as items_summary
-            FROM orders o
-            LEFT JOIN order_items oi ON o.id = oi.order_id
-            WHERE o.number LIKE ? OR o.note LIKE ? OR oi.name LIKE ?
-            GROUP BY o.id
-            ORDER BY o.created_at DESC
-            LIMIT ?
-        """
-        search_term = f"%{query}%"
-        return list(conn.execute(sql, (search_term, search_term, search_term, limit)))
+        if not _order_fts_enabled(conn):
+            return _search_orders_like(conn, query, limit)
+        results: List[sqlite3.Row] = []
+        if query.isdigit():
+            results.extend(conn.execute(
+                f"SELECT o.*, {_ORDER_SUMMARY_COLUMNS} FROM orders o WHERE o.number = ?", (int(query),)
+            ))
+        match = _fts_prefix_query(query)
+        if match and len(results) < limit:
+            sql = f"""
+                SELECT o.*, {_ORDER_SUMMARY_COLUMNS}
+                FROM (SELECT rowid, rank FROM orders_fts WHERE orders_fts MATCH ? ORDER BY rank LIMIT ?) f
+                JOIN orders o ON o.id = f.rowid
+                ORDER BY f.rank, o.id DESC
+            """
+            seen = {r["id"] for r in results}
+            for row in conn.execute(sql, (match, limit + len(seen))):
+                if row["id"] not in seen and len(results) < limit:
+                    results.append(row)
+        return results
     finally:
-        conn.close()
+        release(conn)
+
+
+def _search_orders_like(conn: sqlite3.Connection, query: str, limit: int) -> List[sqlite3.Row]:
+    """Substring search for SQLite builds without FTS5."""
+    sql = """
+        SELECT DISTINCT o.*, 
+               COUNT(oi.id) as item_count,
+               GROUP_CONCAT(oi.name || ' x' || oi.qty, ', ') as items_summary
+        FROM orders o
+        LEFT JOIN order_items oi ON o.id = oi.order_id
+        WHERE o.number LIKE ? OR o.note LIKE ? OR oi.name LIKE ?
+        GROUP BY o.id
+        ORDER BY o.created_at DESC
+        LIMIT ?
+    """
+    search_term = f"%{query}%"
+    return list(conn.execute(sql, (search_term, search_term, search_term, limit)))
 
 
 def get_popular_items(days: int = 7, limit: int = 10) -> List[sqlite3.Row]:
     """Get most popular items in the last N days."""
-    conn = connect()
+    conn = acquire()
     try:
         sql = """
-            SELECT oi.name, oi.category_name, 
-                   SUM(oi.qty) as total_qty,
-                   SUM(oi.qty * oi.unit_price_cents) as total_revenue,
-                   COUNT(DISTINCT o.id) as order_count
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.id
-            WHERE o.created_at >= datetime('now', '-{} days')
-            GROUP BY oi.name, oi.category_name
+            SELECT item_name AS name, category_name,
+                   SUM(qty) as total_qty,
+                   SUM(revenue_cents) as total_revenue,
+                   SUM(order_count) as order_count
+            FROM sales_daily_item
+            WHERE day >= ?
+            GROUP BY item_name, category_name
             ORDER BY total_qty DESC
             LIMIT ?
-        """.format(days)
-        return list(conn.execute(sql, (limit,)))
+        """
+        since = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        return list(conn.execute(sql, (since, limit)))
     finally:
-        conn.close()
+        release(conn)
+
+
+BACKUP_KEEP_DAILY = int(os.environ.get("CRISPINO_BACKUP_KEEP_DAILY", "7"))
+BACKUP_KEEP_WEEKLY = int(os.environ.get("CRISPINO_BACKUP_KEEP_WEEKLY", "4"))
+BACKUP_INTERVAL_HOURS = float(os.environ.get("CRISPINO_BACKUP_INTERVAL_HOURS", "24"))
+_BACKUP_NAME = re.compile(r"^crispino_backup_(\d{8}_\d{6})(?:_\d+)?\.db(\.gz)?$")
+
 
+def backup_database(backup_path: str = None, compress: bool = False) -> str:
+    """Create an online backup of the database.
 
-def backup_database(backup_path: str = None) -> str:
-    """Create a backup of the database."""
+    Uses the SQLite backup API in a single step. Under WAL that step only holds
+    a read snapshot, so checkouts keep committing while it copies; a step-wise
+    copy would instead restart from the first page after every foreign commit
+    and might never finish during a rush. The result is integrity-checked and
+    optionally gzipped.
+    """
     if backup_path is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         backup_path = str(DATA_DIR / f"crispino_backup_{timestamp}.db")
-    
-    import shutil
-    shutil.copy2(DB_PATH, backup_path)
+        n = 1
+        while os.path.exists(backup_path) or os.path.exists(backup_path + ".gz"):
+            n += 1
+            backup_path = str(DATA_DIR / f"crispino_backup_{timestamp}_{n}.db")
+
+    final_path = backup_path
+    if compress:
+        backup_path += ".part"
+    src = connect()
+    dest = sqlite3.connect(backup_path)
+    try:
+        src.backup(dest, pages=-1)
+        # Standalone single-file copy, no -wal/-shm companions.
+        dest.execute("PRAGMA journal_mode=DELETE")
+        result = dest.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != "ok":
+            raise RuntimeError(f"Backup integrity check failed: {result}")
+    except BaseException:
+        dest.close()
+        Path(backup_path).unlink(missing_ok=True)
+        raise
+    finally:
+        src.close()
+    dest.close()
+
+    if compress:
+        gz_path = final_path + ".gz"
+        with open(backup_path, "rb") as f_in, gzip.open(gz_path, "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(backup_path)
+        return gz_path
     return backup_path
 
 
-def export_data(format: str = "json") -> str:
-    """Export all data in specified format."""
+def list_backups() -> List[Tuple[datetime, Path]]:
+    """Auto-named backups in DATA_DIR, newest first."""
+    found = []
+    for path in DATA_DIR.iterdir():
+        m = _BACKUP_NAME.match(path.name)
+        if m:
+            found.append((datetime.strptime(m.group(1), "%Y%m%d_%H%M%S"), path))
+    return sorted(found, reverse=True)
+
+
+def prune_backups(keep_daily: int = BACKUP_KEEP_DAILY, keep_weekly: int = BACKUP_KEEP_WEEKLY) -> List[str]:
+    """Keep the newest backup of each of the last N days and M ISO weeks; delete the rest.
+
+    Only auto-named backups are considered. Returns the deleted paths.
+    """
+    keep: set = set()
+    days: List[str] = []
+    weeks: List[Tuple[int, int]] = []
+    for taken, path in list_backups():
+        day = taken.strftime("%Y-%m-%d")
+        week = tuple(taken.isocalendar())[:2]
+        if day not in days and len(days) < keep_daily:
+            days.append(day)
+            keep.add(path)
+        if week not in weeks and len(weeks) < keep_weekly:
+            weeks.append(week)
+            keep.add(path)
+    deleted = []
+    for _, path in list_backups():
+        if path not in keep:
+            path.unlink(missing_ok=True)
+            deleted.append(str(path))
+    return deleted
+
+
+class BackupScheduler:
+    """Background thread that takes a backup whenever the newest one is older than the interval."""
+
+    def __init__(self, interval_hours: float = BACKUP_INTERVAL_HOURS, check_seconds: float = 300.0) -> None:
+        self.interval = timedelta(hours=interval_hours)
+        self.check_seconds = check_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+
+    def due(self) -> bool:
+        backups = list_backups()
+        return not backups or datetime.now() - backups[0][0] >= self.interval
+
+    def run_once(self) -> Optional[str]:
+        # Every worker process runs a scheduler; the lock lets only one back up at a time,
+        # and the others then see a fresh backup and skip.
+        with process_lock("backup") as locked:
+            if not locked or not self.due():
+                return None
+            return self._backup()
+
+    def _backup(self) -> Optional[str]:
+        try:
+            path = backup_database(compress=True)
+            prune_backups()
+            self.last_error = None
+            return path
+        except Exception as e:  # keep the scheduler alive; surfaced via last_error
+            self.last_error = str(e)
+            return None
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.check_seconds):
+            self.run_once()
+
+    def start(self) -> None:
+        if self.interval.total_seconds() <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="crispino-backup", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# --- Print spooler ---
+# Receipts and kitchen slips go straight to thermal printers as ESC/POS bytes,
+# so checkout never waits on the browser's print dialog. A target is either
+# tcp://host[:port] (raw socket, port 9100 by default) or a file/device path
+# (file:///dev/usb/lp0, /dev/usb/lp0, \\host\printer). Targets come from the
+# printer_customer / printer_kitchen settings, falling back to the
+# CRISPINO_PRINTER_CUSTOMER / CRISPINO_PRINTER_KITCHEN environment variables;
+# a copy without a target is left to the browser print pages.
+
+PRINT_COPIES: Tuple[str, ...] = ("customer", "kitchen")
+PRINT_RETRIES = int(os.environ.get("CRISPINO_PRINT_RETRIES", "5"))
+PRINT_RETRY_DELAY = 2.0  # seconds before the first retry; doubles per attempt
+PRINT_RETRY_MAX_DELAY = 60.0
+PRINT_TIMEOUT = 5.0
+PRINT_HISTORY = 200
+
+print_jobs_total = Counter("crispino_print_jobs_total", "Finished print jobs by copy and outcome", ("copy", "status"))
+
+
+def clean_printer_target(target: str) -> str:
+    """Validate a printer target; '' means no printer for that copy."""
+    target = (target or "").strip()
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rstrip("/").partition(":")
+        if not host or (port and not port.isdigit()):
+            raise ValueError(f"Invalid printer address: {target}")
+    return target
+
+
+def printer_targets() -> Dict[str, str]:
+    """Configured printer target per copy (customer/kitchen), from the settings snapshot."""
+    snap = get_menu_snapshot()
+    targets = {"customer": snap.printer_customer, "kitchen": snap.printer_kitchen}
+    return {copy: target for copy, target in targets.items() if target}
+
+
+def send_to_printer(target: str, data: bytes, timeout: float = PRINT_TIMEOUT) -> None:
+    if target.startswith("tcp://"):
+        host, _, port = target[len("tcp://"):].rstrip("/").partition(":")
+        with socket.create_connection((host, int(port or 9100)), timeout=timeout) as sock:
+            sock.sendall(data)
+        return
+    path = target[len("file://"):] if target.startswith("file://") else target
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+@dataclass
+class PrintJob:
+    id: int
+    order_id: int
+    number: int
+    copy: str
+    target: str
+    data: bytes
+    status: str = "queued"  # queued -> printing -> done | retrying | failed
+    attempts: int = 0
+    last_error: Optional[str] = None
+    created_at: str = ""
+    finished_at: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "order_id": self.order_id,
+            "number": self.number,
+            "copy": self.copy,
+            "target": self.target,
+            "bytes": len(self.data),
+            "status": self.status,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def claim_print_copies(order_id: int, copies: Iterable[str]) -> List[str]:
+    """Record copies of an order as spooled; returns those no process had claimed yet.
+
+    Claims live in the database rather than in one spooler's memory, so a
+    checkout retry that lands on another worker process is not printed twice.
+    """
+    conn = acquire()
+    try:
+        with conn:
+            _begin_immediate(conn, "print_claim")
+            claimed = [
+                copy for copy in copies
+                if conn.execute(
+                    "INSERT OR IGNORE INTO print_claims(order_id, copy, claimed_at) VALUES(?,?,?)",
+                    (order_id, copy, now_iso()),
+                ).rowcount
+            ]
+        return claimed
+    finally:
+        release(conn)
+
+
+def release_print_claim(order_id: int, copy: str) -> None:
+    conn = acquire()
+    try:
+        with conn:
+            conn.execute("DELETE FROM print_claims WHERE order_id = ? AND copy = ?", (order_id, copy))
+    finally:
+        release(conn)
+
+
+class PrintSpooler:
+    """Background thread that sends queued ESC/POS jobs to their printers.
+
+    A failing job is rescheduled with exponential backoff (up to `retries`
+    retries) rather than retried in place, so one offline printer never
+    holds up jobs for the others. Recent jobs are kept for the status API.
+    """
+
+    def __init__(
+        self,
+        retries: int = PRINT_RETRIES,
+        retry_delay: float = PRINT_RETRY_DELAY,
+        send: Callable[[str, bytes], None] = send_to_printer,
+    ) -> None:
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._send = send
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[float, int, PrintJob]] = []  # heap of (due, job id, job)
+        self._jobs: "OrderedDict[int, PrintJob]" = OrderedDict()
+        self._next_id = 1
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    def enqueue(
+        self,
+        order_id: int,
+        number: int,
+        copies: Dict[str, bytes],
+        reprint: bool = False,
+        targets: Optional[Dict[str, str]] = None,
+    ) -> List[PrintJob]:
+        """Queue each copy that has a printer configured; returns the new jobs.
+
+        Unless `reprint` is set, a copy already spooled for the order (by any
+        worker process, see claim_print_copies) is skipped, so a client
+        retrying a checkout does not print twice. `targets` defaults to
+        printer_targets(), which may reload the menu snapshot, and claiming
+        writes to the DB: async callers call this on an executor thread.
+        """
+        if targets is None:
+            targets = printer_targets()
+        wanted = [copy for copy in copies if copy in targets]
+        if wanted and not reprint:
+            wanted = claim_print_copies(order_id, wanted)
+        jobs = []
+        with self._cond:
+            for copy in wanted:
+                job = PrintJob(self._next_id, order_id, number, copy, targets[copy], copies[copy], created_at=now_iso())
+                self._next_id += 1
+                self._remember(job)
+                heapq.heappush(self._pending, (time.monotonic(), job.id, job))
+                jobs.append(job)
+            self._cond.notify()
+        return jobs
+
+    def retry(self, job_id: int, targets: Optional[Dict[str, str]] = None) -> Optional[PrintJob]:
+        """Re-queue a failed job now, to its copy's current printer; None if it is unknown or not failed."""
+        if targets is None:
+            targets = printer_targets()
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != "failed":
+                return None
+            job.target = targets.get(job.copy, job.target)
+            job.status, job.attempts, job.finished_at = "queued", 0, None
+            heapq.heappush(self._pending, (time.monotonic(), job.id, job))
+            self._cond.notify()
+            return job
+
+    def jobs(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._cond:
+            recent = list(self._jobs.values())[-limit:] if limit > 0 else []
+            return [job.as_dict() for job in reversed(recent)]
+
+    def status(self) -> Dict[str, Any]:
+        with self._cond:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "running": self._thread is not None,
+                "worker_pid": os.getpid(),  # each server process spools its own orders
+                "pending": len(self._pending),
+                "by_status": counts,
+            }
+
+    def _remember(self, job: PrintJob) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > PRINT_HISTORY:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if oldest.status not in ("done", "failed"):
+                break
+            del self._jobs[oldest_id]
+
+    def _next_due(self) -> Optional[PrintJob]:
+        with self._cond:
+            while not self._stopping:
+                if self._pending:
+                    delay = self._pending[0][0] - time.monotonic()
+                    if delay <= 0:
+                        job = heapq.heappop(self._pending)[2]
+                        job.status = "printing"
+                        return job
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            return None
+
+    def run_once(self, job: PrintJob) -> None:
+        try:
+            self._send(job.target, job.data)
+        except Exception as e:  # keep the spooler alive; surfaced per job
+            with self._cond:
+                job.attempts += 1
+                job.last_error = str(e) or type(e).__name__
+                failed = job.attempts > self.retries
+                if failed:
+                    job.status, job.finished_at = "failed", now_iso()
+                    print_jobs_total.inc(job.copy, "failed")
+                else:
+                    job.status = "retrying"
+                    delay = min(self.retry_delay * 2 ** (job.attempts - 1), PRINT_RETRY_MAX_DELAY)
+                    heapq.heappush(self._pending, (time.monotonic() + delay, job.id, job))
+            if failed:
+                # Let a later checkout retry spool the copy again.
+                try:
+                    release_print_claim(job.order_id, job.copy)
+                except sqlite3.Error:
+                    pass
+            return
+        with self._cond:
+            job.attempts += 1
+            job.status, job.last_error, job.finished_at = "done", None, now_iso()
+        print_jobs_total.inc(job.copy, "done")
+
+    def _loop(self) -> None:
+        while True:
+            job = self._next_due()
+            if job is None:
+                return
+            self.run_once(job)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._cond:
+            self._stopping = False
+        self._thread = threading.Thread(target=self._loop, name="crispino-print", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=PRINT_TIMEOUT + 1)
+            self._thread = None
+
+
+print_spooler = PrintSpooler()
+
+
+EXPORT_TABLES: Tuple[str, ...] = ("settings", "categories", "items", "orders", "order_items")
+EXPORT_FORMATS: Tuple[str, ...] = ("json", "ndjson", "csv")
+EXPORT_BATCH_ROWS = 500
+
+_EXPORT_ORDER_BY = {
+    "settings": "key",
+    "categories": "sort_order, id",
+    "items": "sort_order, id",
+    "orders": "id",
+    "order_items": "order_id, id",
+}
+
+
+def _iter_table(conn: sqlite3.Connection, table: str) -> Tuple[List[str], Iterator[sqlite3.Row]]:
+    cur = conn.execute(f"SELECT * FROM {table} ORDER BY {_EXPORT_ORDER_BY[table]}")
+    columns = [d[0] for d in cur.description]
+
+    def rows() -> Iterator[sqlite3.Row]:
+        while True:
+            batch = cur.fetchmany(EXPORT_BATCH_ROWS)
+            if not batch:
+                return
+            yield from batch
+
+    return columns, rows()
+
+
+def _export_chunks(format: str, tables: Tuple[str, ...]) -> Iterator[str]:
+    # Dedicated connection: a streaming response may resume this generator on
+    # different worker threads, so it must not borrow a thread's pooled handle.
     conn = connect()
     try:
-        data = {
-            "export_date": now_iso(),
-            "settings": {},
-            "categories": [],
-            "items": [],
-            "orders": [],
-            "order_items": []
-        }
-        
-        # Export settings
-        for row in conn.execute("SELECT key, value FROM settings"):
-            data["settings"][row["key"]] = row["value"]
-        
-        # Export categories
-        for row in conn.execute("SELECT * FROM categories ORDER BY sort_order"):
-            data["categories"].append(dict(row))
-        
-        # Export items
-        for row in conn.execute("SELECT * FROM items ORDER BY sort_order"):
-            data["items"].append(dict(row))
-        
-        # Export orders
-        for row in conn.execute("SELECT * FROM orders ORDER BY created_at"):
-            data["orders"].append(dict(row))
-        
-        # Export order items
-        for row in conn.execute("SELECT * FROM order_items ORDER BY order_id, id"):
-            data["order_items"].append(dict(row))
-        
-        if format.lower() == "json":
-            import json
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            export_path = str(DATA_DIR / f"crispino_export_{timestamp}.json")
-            with open(export_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            return export_path
+        conn.execute("BEGIN")  # one consistent snapshot across all tables
+        if format == "ndjson":
+            lines: List[str] = []
+            for table in tables:
+                _, rows = _iter_table(conn, table)
+                for row in rows:
+                    lines.append(json.dumps({"table": table, "row": dict(row)}, ensure_ascii=False) + "\n")
+                    if len(lines) >= EXPORT_BATCH_ROWS:
+                        yield "".join(lines)
+                        lines.clear()
+            yield "".join(lines)
+        elif format == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for table in tables:
+                columns, rows = _iter_table(conn, table)
+                writer.writerow(columns)
+                for n, row in enumerate(rows, start=1):
+                    writer.writerow(tuple(row))
+                    if n % EXPORT_BATCH_ROWS == 0:
+                        yield buf.getvalue()
+                        buf.seek(0)
+                        buf.truncate()
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
         else:
-            raise ValueError(f"Unsupported export format: {format}")
-            
+            # Same document shape as the original in-memory JSON export.
+            parts = ['{"export_date": %s' % json.dumps(now_iso())]
+            for table in tables:
+                _, rows = _iter_table(conn, table)
+                if table == "settings":
+                    parts.append(', "settings": {')
+                    for n, row in enumerate(rows):
+                        parts.append(("," if n else "") + json.dumps(row["key"]) + ": " + json.dumps(row["value"], ensure_ascii=False))
+                    parts.append("}")
+                else:
+                    parts.append(", %s: [" % json.dumps(table))
+                    for n, row in enumerate(rows):
+                        parts.append(("," if n else "") + json.dumps(dict(row), ensure_ascii=False))
+                        if len(parts) >= EXPORT_BATCH_ROWS:
+                            yield "".join(parts)
+                            parts.clear()
+                    parts.append("]")
+            parts.append("}\n")
+            yield "".join(parts)
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+
+def iter_export(format: str = "ndjson", tables: Optional[Tuple[str, ...]] = None) -> Iterator[str]:
+    """Stream an export as text chunks in constant memory.
+
+    ndjson emits one {"table": ..., "row": {...}} line per row; csv emits a header
+    plus rows per table (pass a single table for a well-formed file); json emits
+    the legacy single-document layout.
+    """
+    format = format.lower()
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    tables = tuple(tables or EXPORT_TABLES)
+    unknown = [t for t in tables if t not in EXPORT_TABLES]
+    if unknown:
+        raise ValueError(f"Unknown export table: {', '.join(unknown)}")
+    return _export_chunks(format, tables)
+
+
+ORDER_EXPORT_MAX_LIMIT = 1000
+
+
+def export_orders_after(after: int = 0, limit: int = 500) -> Dict[str, Any]:
+    """One page of orders with id > after, lines nested, for incremental sync.
+
+    next_cursor is the last order id returned (or `after` when nothing is new);
+    feed it back as `after` to continue.
+    """
+    limit = max(1, min(int(limit), ORDER_EXPORT_MAX_LIMIT))
+    conn = acquire()
+    try:
+        rows = list(conn.execute("SELECT * FROM orders WHERE id > ? ORDER BY id LIMIT ?", (after, limit + 1)))
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        orders = [dict(r, items=[]) for r in rows]
+        if orders:
+            by_id = {o["id"]: o for o in orders}
+            lines = conn.execute(
+                "SELECT * FROM order_items WHERE order_id >= ? AND order_id <= ? ORDER BY order_id, id",
+                (orders[0]["id"], orders[-1]["id"]),
+            )
+            for line in lines:
+                by_id[line["order_id"]]["items"].append(dict(line))
+        return {
+            "orders": orders,
+            "next_cursor": orders[-1]["id"] if orders else after,
+            "has_more": has_more,
+        }
+    finally:
+        release(conn)
+
+
+def gzip_chunks(chunks: Iterator[str]) -> Iterator[bytes]:
+    """Gzip a text chunk stream on the fly."""
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = comp.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield comp.flush()
+
+
+def _write_export(path: Path, chunks: Iterator[str], compress: bool) -> None:
+    if compress:
+        with open(path, "wb") as f:
+            for data in gzip_chunks(chunks):
+                f.write(data)
+    else:
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+
+def export_data(format: str = "json", compress: bool = False) -> str:
+    """Export all data in specified format.
+
+    json/ndjson write a single file; csv writes one file per table into a
+    directory. Returns the file or directory path.
+    """
+    format = format.lower()
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    suffix = ".gz" if compress else ""
+    if format == "csv":
+        export_dir = DATA_DIR / f"crispino_export_{timestamp}"
+        export_dir.mkdir(parents=True, exist_ok=True)
+        for table in EXPORT_TABLES:
+            _write_export(export_dir / f"{table}.csv{suffix}", iter_export("csv", (table,)), compress)
+        return str(export_dir)
+    export_path = DATA_DIR / f"crispino_export_{timestamp}.{format}{suffix}"
+    _write_export(export_path, iter_export(format), compress)
+    return str(export_path)
@@ -1,15 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import sys
+import time
+import zlib
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
 from datetime import datetime
 
-from fastapi import FastAPI, Form, HTTPException, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Form, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, HTMLResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel, Field
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
 
 import db
 
@@ -22,33 +28,295 @@ else:
     BASE_DIR = Path(__file__).resolve().parent
 
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
-app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
+
+
+# --- Static assets ---
+# Pages link assets as /static/<path>?v=<content hash>. A URL carrying the
+# current hash can never change, so browsers keep it for a year without
+# revalidating; a deploy changes the hash and therefore the URL. Assets are
+# hashed once at import, so edits to static files need a restart.
+
+STATIC_DIR = BASE_DIR / "static"
+STATIC_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _hash_static_assets(directory: Path) -> Dict[str, str]:
+    hashes = {}
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            hashes[path.relative_to(directory).as_posix()] = hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+    return hashes
+
+
+_asset_hashes = _hash_static_assets(STATIC_DIR)
+
+
+def static_url(path: str) -> str:
+    version = _asset_hashes.get(path)
+    return f"/static/{path}?v={version}" if version else f"/static/{path}"
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles that marks content-hashed URLs immutable; other requests revalidate via ETag."""
+
+    def file_response(self, full_path: Any, stat_result: Any, scope: Dict[str, Any], status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        path = Path(self.get_path(scope)).as_posix()
+        fresh = version is not None and version == _asset_hashes.get(path)
+        response.headers["Cache-Control"] = STATIC_IMMUTABLE if fresh else "no-cache"
+        return response
+
+
+templates.env.globals["static_url"] = static_url
+app.mount("/static", AssetFiles(directory=str(STATIC_DIR)), name="static")
+
+backup_scheduler = db.BackupScheduler()
+
+http_request_seconds = db.Histogram(
+    "crispino_http_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+
+
+class RequestTimingMiddleware:
+    """Record every request's latency in http_request_seconds, labelled by route template.
+
+    Event streams are skipped: their duration is the subscriber's connection time.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        t0 = time.perf_counter()
+        response = {"status": 500, "stream": False}
+
+        async def send_timed(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["stream"] = any(
+                    k == b"content-type" and v.startswith(b"text/event-stream") for k, v in message.get("headers", [])
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            if not response["stream"]:
+                route = scope.get("route")
+                path = getattr(route, "path", None) or "<unmatched>"
+                http_request_seconds.observe(time.perf_counter() - t0, scope["method"], path, str(response["status"]))
+
+
+# Compression sits inside the timing middleware, so route latencies include it.
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+GZIP_THREAD_SIZE = 64 * 1024  # larger bodies are compressed off the event loop (zlib releases the GIL)
+COMPRESSIBLE_TYPES = frozenset({
+    "text/html", "text/css", "text/plain", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "application/x-ndjson", "image/svg+xml",
+})
+
+
+class CompressionMiddleware:
+    """Gzip text responses of at least GZIP_MIN_SIZE bytes for clients that accept it.
+
+    Only text-like content types are compressed; event streams, images,
+    ESC/POS bytes and already-compressed downloads pass through untouched.
+    Streamed bodies are flushed per chunk, so streaming exports still
+    arrive incrementally.
+    """
+
+    @staticmethod
+    async def _deflate(compressor: Any, body: bytes, mode: int) -> bytes:
+        def run() -> bytes:
+            return compressor.compress(body) + compressor.flush(mode)
+
+        if len(body) < GZIP_THREAD_SIZE:
+            return run()
+        return await asyncio.get_running_loop().run_in_executor(None, run)
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or "gzip" not in Headers(scope=scope).get("accept-encoding", ""):
+            await self.app(scope, receive, send)
+            return
+        state: Dict[str, Any] = {"start": None, "compressor": None, "passthrough": False}
+
+        async def send_compressed(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                state["passthrough"] = (
+                    media_type not in COMPRESSIBLE_TYPES
+                    or "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                )
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            start, compressor = state["start"], state["compressor"]
+            body, more_body = message.get("body", b""), message.get("more_body", False)
+            if start is not None:
+                state["start"] = None
+                if state["passthrough"] or (not more_body and len(body) < GZIP_MIN_SIZE):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = state["compressor"] = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = "gzip"
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = await self._deflate(compressor, body, zlib.Z_FINISH)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+            elif state["passthrough"]:
+                await send(message)
+                return
+            chunk = await self._deflate(compressor, body, zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestTimingMiddleware)
 
 
 @app.on_event("startup")
 def startup() -> None:
     db.ensure_schema()
+    backup_scheduler.start()
+    db.print_spooler.start()
+    db.kitchen_poller.start()
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    backup_scheduler.stop()
+    db.print_spooler.stop()
+    db.kitchen_poller.stop()
+    db.shutdown_executors()
+    db.close_pool()
+
+
+# --- Conditional GET ---
+# Pages and JSON built only from the menu snapshot are rendered once per menu
+# generation and served with an ETag (a hash of the body, so it agrees across
+# restarts). Tablets revalidate on every load and get a 304 until the menu or
+# settings change.
+
+_page_cache: Dict[Tuple[str, str], Tuple[int, str, str]] = {}
+MENU_JSON_KEY = ("menu", "json")
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in tags)
+
+
+def _snapshot_body(snap: db.MenuSnapshot, key: Tuple[str, str], render: Callable[[], str]) -> Tuple[str, str]:
+    """(etag, body) for a body derived only from `snap`, rendered once per generation."""
+    cached = _page_cache.get(key)
+    if cached is None or cached[0] != snap.generation:
+        body = render()
+        etag = f'W/"{hashlib.sha1(body.encode()).hexdigest()[:20]}"'
+        cached = _page_cache[key] = (snap.generation, etag, body)
+    return cached[1], cached[2]
+
+
+def _snapshot_response(
+    request: Request, snap: db.MenuSnapshot, key: Tuple[str, str], render: Callable[[], str], media_type: str
+) -> Response:
+    """Serve a body derived only from `snap` (rendered once per generation), honouring If-None-Match."""
+    etag, body = _snapshot_body(snap, key, render)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def _snapshot_page(request: Request, snap: db.MenuSnapshot, name: str, context: Dict[str, Any]) -> Response:
+    def render() -> str:
+        return templates.get_template(name).render(dict(context, request=request))
+
+    return _snapshot_response(request, snap, (name, request.url.path), render, "text/html")
+
+
+def _render_menu_json(snap: db.MenuSnapshot) -> str:
+    # Escape "<" so the same JSON can be embedded in a <script> block.
+    return json.dumps(db.menu_payload(snap), separators=(",", ":")).replace("<", "\\u003c")
+
+
+def _menu_json(snap: db.MenuSnapshot) -> str:
+    """The menu JSON served by /api/menu and embedded in the POS page, serialized once per generation."""
+    return _snapshot_body(snap, MENU_JSON_KEY, lambda: _render_menu_json(snap))[1]
 
 
 @app.get("/", response_class=HTMLResponse)
-def pos(request: Request):
-    menu = db.get_menu_grouped()
-    cafe_name = db.get_setting("cafe_name") or "Crispino Cafe"
-    tax_rate = float(db.get_setting("tax_rate_percent") or "0")
-    return templates.TemplateResponse(
-        "pos.html",
-        {"request": request, "menu": menu, "cafe_name": cafe_name, "tax_rate": tax_rate},
+async def pos(request: Request):
+    snap = await db.run_db(db.get_menu_snapshot)
+    # The grid is drawn by pos.js from the embedded menu, which it then keeps current via /api/menu/changes.
+    return _snapshot_page(
+        request, snap, "pos.html",
+        {"menu_json": _menu_json(snap), "cafe_name": snap.cafe_name, "tax_rate": snap.tax_rate},
+    )
+
+
+@app.get("/api/menu")
+async def api_menu(request: Request):
+    """The full menu as compact JSON with its version (ETag-validated)."""
+    snap = await db.run_db(db.get_menu_snapshot)
+    return _snapshot_response(request, snap, MENU_JSON_KEY, lambda: _render_menu_json(snap), "application/json")
+
+
+@app.get("/api/menu/changes")
+async def api_menu_changes(since: int = Query(..., ge=0)):
+    """Menu changes after version `since`: changed categories/items/settings and deleted ids."""
+    changes = await db.run_db(db.menu_changes, since)
+    return Response(
+        json.dumps(changes, separators=(",", ":")), media_type="application/json", headers={"Cache-Control": "no-store"}
+    )
+
+
+@app.get("/sw.js", include_in_schema=False)
+async def service_worker():
+    # Served from the root so the worker's scope covers the POS page, not just /static/.
+    return FileResponse(
+        BASE_DIR / "static" / "sw.js",
+        media_type="application/javascript",
+        headers={"Cache-Control": "no-cache"},
     )
 
 
 @app.post("/checkout")
-def checkout(
+async def checkout(
     request: Request,
     cart_json: str = Form(...),
     payment_method: str = Form("cash"),
     cash_received: int = Form(0),  # paisa (minor unit)
     note: str = Form(""),
+    idempotency_key: str = Form(""),
 ):
+    # Clients may also send the key as a header; a replayed key gets the original order back.
+    idempotency_key = idempotency_key or request.headers.get("Idempotency-Key", "")
     try:
         cart_lines = json.loads(cart_json)
         if not isinstance(cart_lines, list):
@@ -65,63 +333,359 @@ def checkout(
         cash_received_cents = 0
 
     try:
-        order_id = db.create_order_from_cart(
+        order_id, order_number = await db.run_db(
+            db.create_order_from_cart,
             cart_lines=cart_lines,
             payment_method=payment_method,
             cash_received_cents=cash_received_cents,
             note=note or "",
+            idempotency_key=idempotency_key,
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-    # Get the order number for client-side tracking
-    order, _ = db.get_order(order_id)
-    
+    # Render the printouts now, so the print chain below is served from memory.
+    spooled = (await db.run_db(_render_receipts, [order_id]))[order_id]
+
     next_url = request.url_for("print_kitchen", order_id=order_id)
     back_url = request.url_for("pos")
     customer_url = request.url_for("print_customer", order_id=order_id)
+
+    # Copies sent to a printer by the spooler are left out of the browser print chain.
+    if "customer" in spooled and "kitchen" in spooled:
+        return RedirectResponse(f"{back_url}?order_number={order_number}", status_code=303)
+    if "customer" in spooled:
+        return RedirectResponse(f"{next_url}?back={back_url}&order_number={order_number}", status_code=303)
+    if "kitchen" in spooled:
+        return RedirectResponse(f"{customer_url}?back={back_url}&order_number={order_number}", status_code=303)
     
     # Add order number to URL for client-side tracking
-    return RedirectResponse(f"{customer_url}?next={next_url}&back={back_url}&order_number={order.number}", status_code=303)
+    return RedirectResponse(f"{customer_url}?next={next_url}&back={back_url}&order_number={order_number}", status_code=303)
+
+
+# --- Printouts ---
+# The print pages only read next/back from the query string in the browser, so
+# each order's HTML (and ESC/POS stream) is identical on every print and reprint.
+
+def _build_receipt(order: db.Order, items: List[Any], cafe_name: str) -> db.Receipt:
+    context = {"order": order, "items": items, "cafe_name": cafe_name}
+    return db.Receipt(
+        order_id=order.id,
+        number=order.number,
+        customer_html=templates.get_template("print_customer.html").render(context),
+        kitchen_html=templates.get_template("print_kitchen.html").render(context),
+        customer_escpos=db.render_escpos(order, items, cafe_name),
+        kitchen_escpos=db.render_escpos(order, items, cafe_name, kitchen=True),
+    )
 
 
-@app.get("/print/customer/{order_id}", response_class=HTMLResponse)
-def print_customer(request: Request, order_id: int, next: str = "", back: str = ""):
+def _cache_receipts(orders: List[Tuple[db.Order, List[Any]]]) -> Dict[int, List[str]]:
+    """Render, cache and spool printouts for new orders (runs on a db executor thread).
+
+    Returns the copies handed to the print spooler, per order id.
+    """
+    cafe_name = db.get_menu_snapshot().cafe_name
+    targets = db.printer_targets()
+    spooled = {}
+    for order, items in orders:
+        receipt = _build_receipt(order, items, cafe_name)
+        db.receipt_cache.put(receipt)
+        spooled[receipt.order_id] = _spool_receipt(receipt, targets)
+    return spooled
+
+
+def _render_receipts(order_ids: List[int]) -> Dict[int, List[str]]:
+    return _cache_receipts(list(db.get_orders(order_ids).values()))
+
+
+def _receipt_copies(receipt: db.Receipt, copy: str = "all") -> Dict[str, bytes]:
+    copies = {"customer": receipt.customer_escpos, "kitchen": receipt.kitchen_escpos}
+    return copies if copy == "all" else {copy: copies[copy]}
+
+
+def _spool_receipt(receipt: db.Receipt, targets: Dict[str, str]) -> List[str]:
+    """Hand a new order's printouts to the print spooler; returns the copies it took."""
+    jobs = db.print_spooler.enqueue(receipt.order_id, receipt.number, _receipt_copies(receipt), targets=targets)
+    return [job.copy for job in jobs]
+
+
+def _load_receipt(order_id: int) -> db.Receipt:
     order, items = db.get_order(order_id)
-    cafe_name = db.get_setting("cafe_name") or "Crispino Cafe"
-    return templates.TemplateResponse(
-        "print_customer.html",
-        {"request": request, "order": order, "items": items, "cafe_name": cafe_name, "next_url": next, "back_url": back},
-    )
+    receipt = _build_receipt(order, items, db.get_menu_snapshot().cafe_name)
+    db.receipt_cache.put(receipt)
+    return receipt
+
+
+async def _receipt(order_id: int) -> db.Receipt:
+    receipt = db.receipt_cache.get(order_id)
+    if receipt is None:
+        try:
+            receipt = await db.run_db(_load_receipt, order_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Order not found")
+    return receipt
+
+
+@app.get("/print/customer/{order_id}", response_class=HTMLResponse)
+async def print_customer(request: Request, order_id: int, next: str = "", back: str = ""):
+    return HTMLResponse((await _receipt(order_id)).customer_html)
 
 
 @app.get("/print/kitchen/{order_id}", response_class=HTMLResponse)
-def print_kitchen(request: Request, order_id: int, back: str = ""):
-    order, items = db.get_order(order_id)
-    cafe_name = db.get_setting("cafe_name") or "Crispino Cafe"
-    return templates.TemplateResponse(
-        "print_kitchen.html",
-        {"request": request, "order": order, "items": items, "cafe_name": cafe_name, "back_url": back or request.url_for("pos")},
+async def print_kitchen(request: Request, order_id: int, back: str = ""):
+    return HTMLResponse((await _receipt(order_id)).kitchen_html)
+
+
+@app.get("/print/{copy}/{order_id}/escpos")
+async def print_escpos(copy: Literal["customer", "kitchen"], order_id: int):
+    """Raw ESC/POS bytes of a printout, for sending straight to a thermal printer."""
+    receipt = await _receipt(order_id)
+    data = receipt.customer_escpos if copy == "customer" else receipt.kitchen_escpos
+    return Response(
+        data,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="order_{receipt.number}_{copy}.bin"'},
+    )
+
+
+@app.post("/api/print/{order_id}")
+async def api_print_order(order_id: int, copy: Literal["customer", "kitchen", "all"] = "all"):
+    """Send an order's printouts to the configured printers again (reprint)."""
+    receipt = await _receipt(order_id)
+    targets = await db.run_db(db.printer_targets)
+    if copy != "all" and copy not in targets:
+        raise HTTPException(status_code=400, detail=f"No printer configured for {copy} copies")
+    jobs = db.print_spooler.enqueue(
+        receipt.order_id, receipt.number, _receipt_copies(receipt, copy), reprint=True, targets=targets
+    )
+    return {"jobs": [job.as_dict() for job in jobs]}
+
+
+@app.get("/api/print/jobs")
+async def api_print_jobs(limit: int = Query(50, ge=1, le=db.PRINT_HISTORY)):
+    """Recent print jobs (newest first) with their status, attempts and last error."""
+    return {"spooler": db.print_spooler.status(), "jobs": db.print_spooler.jobs(limit)}
+
+
+@app.post("/api/print/jobs/{job_id}/retry")
+async def api_retry_print_job(job_id: int):
+    job = db.print_spooler.retry(job_id, await db.run_db(db.printer_targets))
+    if job is None:
+        raise HTTPException(status_code=404, detail="No failed print job with that id")
+    return job.as_dict()
+
+
+# --- Kitchen display ---
+
+KITCHEN_KEEPALIVE_SECONDS = 15.0
+
+
+def _sse_ticket(ticket: Dict[str, Any]) -> str:
+    return f"id: {ticket['id']}\nevent: order\ndata: {json.dumps(ticket, separators=(',', ':'))}\n\n"
+
+
+@app.get("/kitchen", response_class=HTMLResponse)
+async def kitchen(request: Request):
+    snap = await db.run_db(db.get_menu_snapshot)
+    return _snapshot_page(request, snap, "kitchen.html", {"cafe_name": snap.cafe_name})
+
+
+@app.get("/api/kitchen/stream")
+async def api_kitchen_stream(
+    request: Request,
+    last_event_id: Optional[int] = Header(None),
+    backlog: int = Query(20, ge=0, le=db.KITCHEN_FEED_BACKLOG),
+):
+    """Server-Sent Events feed of new orders for kitchen screens.
+
+    Subscribers are woken by the in-process kitchen feed and served from its
+    memory backlog, so an idle or busy screen costs no queries. A reconnect
+    with Last-Event-ID replays what it missed; a fresh connection gets the
+    last `backlog` tickets and then only orders newer than those. With several
+    worker processes the feed is filled by db.kitchen_poller, which also
+    imports the other workers' orders.
+    """
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    # Subscribe before reading the backlog so nothing published in between is lost.
+    unsubscribe = db.kitchen_feed.subscribe(lambda: loop.call_soon_threadsafe(wake.set))
+
+    async def missed_since(last_id: int) -> List[Dict[str, Any]]:
+        tickets = db.kitchen_feed.since(last_id)
+        if tickets is None:
+            # Fell out of the memory backlog (long outage or server restart): rebuild from the DB once.
+            tickets = await db.run_db(db.kitchen_tickets_after, last_id)
+        return tickets
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id is not None:
+                tickets = await missed_since(last_event_id)
+                last_id = tickets[-1]["id"] if tickets else last_event_id
+            elif not db.kitchen_feed.last_event_id:
+                # An empty feed (fresh start) knows nothing of earlier orders: take the
+                # newest order id from the DB so only orders after it are streamed live.
+                last_id, tickets = await db.run_db(db.kitchen_backlog, backlog)
+            else:
+                last_id = db.kitchen_feed.last_event_id
+                tickets = [t for t in db.kitchen_feed.recent(backlog) if t["id"] <= last_id]
+            for ticket in tickets:
+                yield _sse_ticket(ticket)
+            while not await request.is_disconnected():
+                try:
+                    await asyncio.wait_for(wake.wait(), KITCHEN_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                wake.clear()
+                for ticket in await missed_since(last_id):
+                    last_id = ticket["id"]
+                    yield _sse_ticket(ticket)
+        finally:
+            unsubscribe()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
+# --- JSON order API ---
+
+class CartLineIn(BaseModel):
+    item_id: int
+    qty: int = Field(gt=0)
+
+
+class OrderIn(BaseModel):
+    items: List[CartLineIn] = Field(min_length=1)
+    payment_method: Literal["cash", "card", "other"] = "cash"
+    cash_received_cents: int = Field(0, ge=0)
+    note: str = ""
+    idempotency_key: Optional[str] = Field(None, max_length=db.IDEMPOTENCY_KEY_MAX_LEN)
+
+
+class OrderBatchIn(BaseModel):
+    orders: List[OrderIn] = Field(min_length=1, max_length=500)
+
+
+class OfflineOrderIn(OrderIn):
+    idempotency_key: str = Field(min_length=1, max_length=db.IDEMPOTENCY_KEY_MAX_LEN)
+    created_at: Optional[str] = None
+
+
+class OrderSyncIn(BaseModel):
+    orders: List[OfflineOrderIn] = Field(min_length=1, max_length=500)
+
+
+def _order_payload(order: db.Order, items: List[Any]) -> Dict[str, Any]:
+    return {
+        "order": {
+            "id": order.id,
+            "number": order.number,
+            "created_at": order.created_at,
+            "total_cents": order.total_cents,
+            "tax_cents": order.tax_cents,
+            "paid_cents": order.paid_cents,
+            "payment_method": order.payment_method,
+            "note": order.note
+        },
+        "items": [dict(item) for item in items]
+    }
+
+
+def _order_spec(body: OrderIn) -> Dict[str, Any]:
+    return {
+        "cart_lines": [line.model_dump() for line in body.items],
+        "payment_method": body.payment_method,
+        "cash_received_cents": body.cash_received_cents,
+        "note": body.note,
+        "idempotency_key": body.idempotency_key,
+    }
+
+
+@app.post("/api/orders", status_code=201)
+async def api_create_order(body: OrderIn):
+    """Create one order from a typed JSON body and return it."""
+    try:
+        order_id, _ = await db.run_db(db.create_order_from_cart, **_order_spec(body))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    order, items = await db.run_db(db.get_order, order_id)
+    spooled = await db.run_db(_cache_receipts, [(order, items)])
+    return dict(_order_payload(order, items), spooled=spooled[order.id])
+
+
+async def _create_orders(specs: List[Dict[str, Any]]):
+    """Create orders in one transaction, then render, cache and spool the new ones.
+
+    Returns (create_orders results, {order_id: (order, items)}, {order_id: spooled copies}).
+    """
+    results = await db.run_db(db.create_orders, specs)
+    created = await db.run_db(db.get_orders, [ids[0] for ids, _ in results if ids])
+    spooled = await db.run_db(_cache_receipts, list(created.values()))
+    return results, created, spooled
+
+
+@app.post("/api/orders/sync")
+async def api_sync_orders(body: OrderSyncIn):
+    """Ingest a till's offline queue in one transaction.
+
+    Every queued order carries its idempotency key, so a queue re-sent after a
+    dropped response maps back to the orders already created.
+    """
+    specs = [dict(_order_spec(o), created_at=o.created_at) for o in body.orders]
+    results, _, spooled = await _create_orders(specs)
+    out = []
+    for spec, (ids, error) in zip(specs, results):
+        entry: Dict[str, Any] = {"idempotency_key": spec["idempotency_key"], "ok": ids is not None}
+        if ids:
+            entry["order_id"], entry["number"] = ids
+            entry["spooled"] = spooled[ids[0]]
+        else:
+            entry["error"] = error
+        out.append(entry)
+    return {"results": out}
+
+
+@app.post("/api/orders/batch")
+async def api_create_orders_batch(body: OrderBatchIn):
+    """Create many orders in one transaction; each result reports created order or error."""
+    results, created, spooled = await _create_orders([_order_spec(o) for o in body.orders])
+    out = []
+    for ids, error in results:
+        if ids:
+            out.append({"ok": True, **_order_payload(*created[ids[0]]), "spooled": spooled[ids[0]]})
+        else:
+            out.append({"ok": False, "error": error})
+    return {"results": out}
+
+
 # --- Admin ---
 
 @app.get("/admin", response_class=HTMLResponse)
-def admin_home(request: Request):
-    cats = db.list_categories()
-    items = db.list_items(include_unavailable=True)
-    cafe_name = db.get_setting("cafe_name") or "Crispino Cafe"
-    tax_rate = db.get_setting("tax_rate_percent") or "0"
+async def admin_home(request: Request):
+    snap = await db.run_db(db.get_menu_snapshot)
     error = request.query_params.get("error", "")
     return templates.TemplateResponse(
         "admin.html",
-        {"request": request, "categories": cats, "items": items, "cafe_name": cafe_name, "tax_rate": tax_rate, "error": error},
+        {
+            "request": request,
+            "categories": snap.categories,
+            "items": snap.items,
+            "cafe_name": snap.cafe_name,
+            "tax_rate": snap.tax_rate_percent,
+            "printer_customer": snap.printer_customer,
+            "printer_kitchen": snap.printer_kitchen,
+            "error": error,
+        },
     )
 
 
 @app.post("/admin/category/new")
-def admin_new_category(name: str = Form(...), sort_order: Optional[str] = Form("")):
+async def admin_new_category(name: str = Form(...), sort_order: Optional[str] = Form("")):
     so: Optional[int] = None
     try:
         if sort_order and int(sort_order) > 0:
@@ -129,23 +693,23 @@ def admin_new_category(name: str = Form(...), sort_order: Optional[str] = Form("
     except Exception:
         so = None
     try:
-        db.create_category(name, so)
+        await db.run_db(db.create_category, name, so)
     except ValueError as e:
         return RedirectResponse(f"/admin?error={str(e)}", status_code=303)
     return RedirectResponse("/admin", status_code=303)
 
 
 @app.post("/admin/category/delete")
-def admin_delete_category(category_id: int = Form(...)):
-    ok = db.delete_category(category_id)
+async def admin_delete_category(category_id: int = Form(...)):
+    ok = await db.run_db(db.delete_category, category_id)
     if not ok:
         return RedirectResponse("/admin?error=Cannot delete category: it still has items.", status_code=303)
-    db.renumber_categories_and_items()
+    await db.run_background(db.renumber_sort_order)
     return RedirectResponse("/admin", status_code=303)
 
 
 @app.post("/admin/item/new")
-def admin_new_item(
+async def admin_new_item(
     name: str = Form(...),
     price_rupees: float = Form(...),
     category_id: int = Form(...),
@@ -160,15 +724,15 @@ def admin_new_item(
     except Exception:
         so = None
     try:
-        db.create_item(name, price_cents, category_id, available == "1", so)
+        await db.run_db(db.create_item, name, price_cents, category_id, available == "1", so)
     except ValueError as e:
         return RedirectResponse(f"/admin?error={str(e)}", status_code=303)
-    db.renumber_categories_and_items()
+    await db.run_background(db.renumber_sort_order)
     return RedirectResponse("/admin", status_code=303)
 
 
 @app.post("/admin/item/update")
-def admin_update_item(
+async def admin_update_item(
     item_id: int = Form(...),
     name: str = Form(...),
     price_rupees: float = Form(...),
@@ -178,7 +742,8 @@ def admin_update_item(
 ):
     price_cents = int(round(float(price_rupees) * 100))
     try:
-        db.update_item(
+        await db.run_db(
+            db.update_item,
             item_id,
             name=name,
             price_cents=price_cents,
@@ -188,87 +753,119 @@ def admin_update_item(
         )
     except ValueError as e:
         return RedirectResponse(f"/admin?error={str(e)}", status_code=303)
-    db.renumber_categories_and_items()
+    await db.run_background(db.renumber_sort_order)
     return RedirectResponse("/admin", status_code=303)
 
 
 @app.post("/admin/item/delete")
-def admin_delete_item(item_id: int = Form(...)):
-    ok = db.delete_item(item_id)
+async def admin_delete_item(item_id: int = Form(...)):
+    ok = await db.run_db(db.delete_item, item_id)
     if not ok:
         return RedirectResponse("/admin?error=Failed to delete item.", status_code=303)
-    db.renumber_categories_and_items()
+    await db.run_background(db.renumber_sort_order)
     return RedirectResponse("/admin", status_code=303)
 
 
 @app.post("/admin/settings")
-def admin_settings(cafe_name: str = Form(...), tax_rate_percent: float = Form(...)):
-    db.set_setting("cafe_name", cafe_name)
-    db.set_setting("tax_rate_percent", str(tax_rate_percent))
+async def admin_settings(
+    cafe_name: str = Form(...),
+    tax_rate_percent: float = Form(...),
+    printer_customer: Optional[str] = Form(None),
+    printer_kitchen: Optional[str] = Form(None),
+):
+    printers = {"printer_customer": printer_customer, "printer_kitchen": printer_kitchen}
+    try:
+        printers = {key: db.clean_printer_target(value) for key, value in printers.items() if value is not None}
+    except ValueError as e:
+        return RedirectResponse(f"/admin?error={e}", status_code=303)
+    await db.run_db(db.set_setting, "cafe_name", cafe_name)
+    await db.run_db(db.set_setting, "tax_rate_percent", str(tax_rate_percent))
+    for key, value in printers.items():
+        await db.run_db(db.set_setting, key, value)
     return RedirectResponse("/admin", status_code=303)
 
 
 # Renumber endpoint (supports both POST button and direct GET)
 @app.post("/admin/renumber")
 @app.get("/admin/renumber")
-def admin_renumber(request: Request):
-    db.renumber_categories_and_items()
+async def admin_renumber(request: Request):
+    await db.run_background(db.renumber_sort_order)
     return RedirectResponse("/admin", status_code=303)
 
 
 # --- New API Endpoints ---
 
 @app.get("/api/orders/recent")
-def api_recent_orders(limit: int = 10):
+async def api_recent_orders(limit: int = 10):
     """Get recent orders for order history."""
     try:
-        orders = db.get_recent_orders(limit)
+        orders = await db.run_db(db.get_recent_orders, limit)
         return {"orders": [dict(order) for order in orders]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/orders")
+async def api_list_orders(
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    payment_method: Optional[str] = None,
+):
+    """Order history, newest first; follow next_before_id to page back."""
+    try:
+        page = await db.run_db(
+            db.list_orders_page, before_id, limit, date_from=date_from, date_to=date_to, payment_method=payment_method
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"orders": [dict(o) for o in page["orders"]], "next_before_id": page["next_before_id"]}
+
+
 @app.get("/api/reports/daily")
-def api_daily_report(date: str = None):
+async def api_daily_report(date: str = None):
     """Get daily sales report."""
     try:
-        report = db.get_daily_report(date)
+        report = await db.run_background(db.get_daily_report, date)
         return report
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/reports/range")
+async def api_range_report(
+    date_from: str = Query(..., alias="from"),
+    date_to: str = Query(..., alias="to"),
+    group_by: str = "day",
+):
+    """Sales for a date range, bucketed by day/week/month/hour/category/item/payment_method."""
+    try:
+        rows = await db.run_background(db.get_range_report, date_from, date_to, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"from": date_from, "to": date_to, "group_by": group_by, "buckets": rows}
+
+
 @app.get("/api/orders/search")
-def api_search_orders(q: str, limit: int = 20):
+async def api_search_orders(q: str, limit: int = 20):
     """Search orders by number, note, or item names."""
     try:
-        orders = db.search_orders(q, limit)
+        orders = await db.run_db(db.search_orders, q, limit)
         return {"orders": [dict(order) for order in orders]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/orders/{order_number}")
-def api_get_order_by_number(order_number: int):
+async def api_get_order_by_number(order_number: int):
     """Get order by order number."""
     try:
-        result = db.get_order_by_number(order_number)
+        result = await db.run_db(db.get_order_by_number, order_number)
         if not result:
             raise HTTPException(status_code=404, detail="Order not found")
         order, items = result
-        return {
-            "order": {
-                "id": order.id,
-                "number": order.number,
-                "created_at": order.created_at,
-                "total_cents": order.total_cents,
-                "tax_cents": order.tax_cents,
-                "paid_cents": order.paid_cents,
-                "payment_method": order.payment_method,
-                "note": order.note
-            },
-            "items": [dict(item) for item in items]
-        }
+        return _order_payload(order, items)
     except HTTPException:
         raise
     except Exception as e:
@@ -276,43 +873,92 @@ def api_get_order_by_number(order_number: int):
 
 
 @app.get("/api/items/popular")
-def api_popular_items(days: int = 7, limit: int = 10):
+async def api_popular_items(days: int = 7, limit: int = 10):
     """Get most popular items in the last N days."""
     try:
-        items = db.get_popular_items(days, limit)
+        items = await db.run_background(db.get_popular_items, days, limit)
         return {"items": [dict(item) for item in items]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/admin/backup")
-def api_create_backup():
+async def api_create_backup(compress: bool = False):
     """Create a database backup."""
     try:
-        backup_path = db.backup_database()
-        return {"message": "Backup created successfully", "path": backup_path}
+        backup_path = await db.run_background(db.backup_database, compress=compress)
+        pruned = await db.run_background(db.prune_backups)
+        return {"message": "Backup created successfully", "path": backup_path, "pruned": pruned}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/admin/export")
-def api_export_data(format: str = "json"):
+async def api_export_data(format: str = "json", compress: bool = False):
     """Export all data."""
     try:
-        export_path = db.export_data(format)
+        export_path = await db.run_background(db.export_data, format, compress=compress)
         return {"message": "Data exported successfully", "path": export_path}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/admin/export/download")
+async def api_export_download(format: str = "ndjson", table: Optional[str] = None, compress: bool = False):
+    """Stream an export as a file download (csv needs a single table)."""
+    if format.lower() == "csv" and not table:
+        raise HTTPException(status_code=400, detail="CSV export needs a table parameter")
+    try:
+        chunks = db.iter_export(format, (table,) if table else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"crispino_export_{timestamp}{'_' + table if table else ''}.{format.lower()}"
+    media_type = {"csv": "text/csv", "ndjson": "application/x-ndjson"}.get(format.lower(), "application/json")
+    body = db.gzip_chunks(chunks) if compress else chunks
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        db.iterate_background(body), media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+@app.get("/api/export/orders")
+async def api_export_orders(after: int = 0, limit: int = 500):
+    """Incremental order export: orders with id > after, lines nested, plus the next cursor."""
+    try:
+        return await db.run_background(db.export_orders_after, after, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text metrics: route latency, per-statement SQL time, lock and executor waits."""
+    return PlainTextResponse(db.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/admin/sql-profile")
+async def api_sql_profile(limit: int = 20, reset: bool = False):
+    """SQL statements by total time spent, heaviest first; reset=true clears the counters."""
+    top = db.sql_profiler.top(limit)
+    if reset:
+        db.sql_profiler.reset()
+    return {"statements": top}
+
+
 # --- New Admin Pages ---
 
 @app.get("/admin/reports", response_class=HTMLResponse)
-def admin_reports(request: Request, date: str = None):
+async def admin_reports(request: Request, date: str = None):
     """Daily reports page."""
     try:
-        report = db.get_daily_report(date)
-        cafe_name = db.get_setting("cafe_name") or "Crispino Cafe"
+        report = await db.run_background(db.get_daily_report, date)
+        cafe_name = (await db.run_db(db.get_menu_snapshot)).cafe_name
         return templates.TemplateResponse(
             "reports.html",
             {"request": request, "report": report, "cafe_name": cafe_name, "date": date or datetime.now().strftime("%Y-%m-%d")},
@@ -322,17 +968,25 @@ def admin_reports(request: Request, date: str = None):
 
 
 @app.get("/admin/history", response_class=HTMLResponse)
-def admin_history(request: Request, q: str = ""):
+async def admin_history(request: Request, q: str = "", before_id: Optional[int] = None):
     """Order history page."""
     try:
+        next_before_id = None
         if q:
-            orders = db.search_orders(q, 50)
+            orders = await db.run_db(db.search_orders, q, 50)
         else:
-            orders = db.get_recent_orders(50)
-        cafe_name = db.get_setting("cafe_name") or "Crispino Cafe"
+            page = await db.run_db(db.list_orders_page, before_id, 50)
+            orders, next_before_id = page["orders"], page["next_before_id"]
+        cafe_name = (await db.run_db(db.get_menu_snapshot)).cafe_name
         return templates.TemplateResponse(
             "history.html",
-            {"request": request, "orders": orders, "cafe_name": cafe_name, "search_query": q},
+            {
+                "request": request,
+                "orders": orders,
+                "cafe_name": cafe_name,
+                "search_query": q,
+                "next_before_id": next_before_id,
+            },
         )
     except Exception as e:
         return RedirectResponse(f"/admin?error={str(e)}", status_code=303)
\ No newline at end of file
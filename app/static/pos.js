@@ -10,17 +10,25 @@
   const cashWrap = document.getElementById('cashWrap');
   const cashIn = document.getElementById('cash_received');
   const searchIn = document.getElementById('search');
-  const form = document.getElementById('checkout_form');
-  const cartJsonEl = document.getElementById('cart_json');
-  const formPay = document.getElementById('form_payment_method');
-  const formCash = document.getElementById('form_cash_received');
-  const formNote = document.getElementById('form_note');
+  const offlineEl = document.getElementById('offlineStatus');
+  const tabsEl = document.getElementById('tabs');
+  const gridsEl = document.getElementById('menuGrids');
+  const menuEmptyEl = document.getElementById('menuEmpty');
+  const taxLabelEl = document.getElementById('taxLabel');
+
+  const OUTBOX_KEY = 'crispino_outbox';
+  const SYNC_INTERVAL_MS = 30000;
+  const MENU_KEY = 'crispino_menu';
+  const ORDER_KEY = 'crispino_order_key';
+  const MENU_POLL_MS = 15000;
 
   let cart = {}; // id -> {id, name, price_cents, qty}
   let lastTotalCents = 0;
   let cashWasAuto = false; // tracks whether the current cash value was auto-filled
   let searchTimeout = null;
   let allItems = []; // Cache all items for search
+  let menu = null; // {version, settings, categories: {id: cat}, items: {id: item}}
+  let taxRate = 0;
 
   function money(cents) { return 'Rs ' + (cents/100).toFixed(2); }
 
@@ -87,7 +95,7 @@
       cartEl.appendChild(row);
     });
 
-    const tax = Math.round(subtotal * (TAX_RATE / 100));
+    const tax = Math.round(subtotal * (taxRate / 100));
     const total = subtotal + tax;
 
     subtotalEl.textContent = money(subtotal);
@@ -137,6 +145,7 @@
   function clearCart() { 
     cart = {}; 
     saveCart(); 
+    localStorage.removeItem(ORDER_KEY);
     render();
     
     // Show feedback
@@ -145,12 +154,99 @@
     }
   }
 
+  function newOrderKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+  }
+
+  // One key per order: made on the first checkout attempt and kept with the cart
+  // until the order is placed or queued. Pressing Pay again after a lost response
+  // (or a page reload) re-sends the same key, so the server hands back the
+  // original order instead of creating a duplicate.
+  function orderKey() {
+    let key = localStorage.getItem(ORDER_KEY);
+    if (!key) {
+      key = newOrderKey();
+      localStorage.setItem(ORDER_KEY, key);
+    }
+    return key;
+  }
+
   function toPaisa(rupeesStr) {
     const n = parseFloat(rupeesStr || '0');
     if (isNaN(n)) return 0;
     return Math.round(n * 100);
   }
 
+  function localTimestamp() {
+    const d = new Date();
+    const pad = n => String(n).padStart(2, '0');
+    return `${d.getFullYear()}-${pad(d.getMonth()+1)}-${pad(d.getDate())} ${pad(d.getHours())}:${pad(d.getMinutes())}:${pad(d.getSeconds())}`;
+  }
+
+  // Offline queue: orders the server could not take are kept here until /api/orders/sync accepts them.
+  function loadOutbox() {
+    try { return JSON.parse(localStorage.getItem(OUTBOX_KEY) || '[]') || []; } catch { return []; }
+  }
+  function saveOutbox(outbox) { localStorage.setItem(OUTBOX_KEY, JSON.stringify(outbox)); }
+
+  function renderOutbox() {
+    if (!offlineEl) return;
+    const pending = loadOutbox().length;
+    offlineEl.hidden = pending === 0 && navigator.onLine;
+    offlineEl.textContent = pending
+      ? `${navigator.onLine ? '⏳' : '📴 Offline —'} ${pending} order${pending === 1 ? '' : 's'} waiting to sync`
+      : '📴 Offline — orders will be queued';
+  }
+
+  function queueOrder(order) {
+    const outbox = loadOutbox();
+    outbox.push(order);
+    saveOutbox(outbox);
+    renderOutbox();
+    if (window.showToast) {
+      window.showToast(`Offline: order saved (${outbox.length} queued)`, 'info', 3000);
+    }
+  }
+
+  let syncing = false;
+  function syncOutbox() {
+    const outbox = loadOutbox();
+    if (syncing || outbox.length === 0 || !navigator.onLine) { renderOutbox(); return; }
+    syncing = true;
+    const batch = outbox.slice(0, 500);
+    fetch('/api/orders/sync', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({orders: batch})
+    })
+      .then(response => {
+        if (!response.ok) throw new Error(`sync failed: ${response.status}`);
+        return response.json();
+      })
+      .then(data => {
+        // Every result settles its order: created ones are done, rejected ones would
+        // be rejected again, so both leave the queue (rejects are kept for review).
+        const settled = new Set(data.results.map(r => r.idempotency_key));
+        const rejected = data.results.filter(r => !r.ok);
+        if (rejected.length) {
+          const failed = JSON.parse(localStorage.getItem(OUTBOX_KEY + '_failed') || '[]');
+          rejected.forEach(r => failed.push({...batch.find(o => o.idempotency_key === r.idempotency_key), error: r.error}));
+          localStorage.setItem(OUTBOX_KEY + '_failed', JSON.stringify(failed));
+        }
+        saveOutbox(loadOutbox().filter(o => !settled.has(o.idempotency_key)));
+        const synced = data.results.length - rejected.length;
+        if (window.showToast && synced) window.showToast(`Synced ${synced} offline order${synced === 1 ? '' : 's'}`, 'success', 2000);
+        if (window.showToast && rejected.length) window.showToast(`${rejected.length} offline order(s) rejected`, 'error', 4000);
+      })
+      .catch(() => {})
+      .finally(() => {
+        syncing = false;
+        renderOutbox();
+        if (loadOutbox().length && navigator.onLine && !document.hidden) setTimeout(syncOutbox, 1000);
+      });
+  }
+
   function checkout() {
     const lines = Object.values(cart).map(l => ({item_id: l.id, qty: l.qty}));
     if (lines.length === 0) { 
@@ -175,30 +271,198 @@
       }
     }
     
-    cartJsonEl.value = JSON.stringify(lines);
-    formPay.value = paySel.value;
     if (paySel.value === 'cash' && (!cashIn.value || cashWasAuto)) {
       cashIn.value = (lastTotalCents / 100).toFixed(2);
     }
-    formCash.value = String(toPaisa(cashIn.value));
-    formNote.value = noteEl.value || '';
-    
-    // Show loading state
+    const order = {
+      items: lines,
+      payment_method: paySel.value,
+      cash_received_cents: paySel.value === 'cash' ? toPaisa(cashIn.value) : 0,
+      note: noteEl.value || '',
+      idempotency_key: orderKey(),
+      created_at: localTimestamp()
+    };
+
     const checkoutBtn = document.getElementById('checkout');
+    const checkoutLabel = checkoutBtn ? checkoutBtn.textContent : '';
+    function done() {
+      noteEl.value = '';
+      clearCart();
+      if (checkoutBtn) { checkoutBtn.disabled = false; checkoutBtn.textContent = checkoutLabel; }
+    }
+
+    if (!navigator.onLine) { queueOrder(order); done(); return; }
+
+    // Show loading state
     if (checkoutBtn) {
       checkoutBtn.disabled = true;
       checkoutBtn.textContent = 'Processing...';
     }
-    
-    // Order number will be stored by the print template after order creation
-    
-    form.submit();
-    clearCart();
+
+    fetch('/api/orders', {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json', 'Idempotency-Key': order.idempotency_key},
+      body: JSON.stringify(order)
+    })
+      .then(response => {
+        // Server down or restarting: keep selling, the order syncs later.
+        if ([502, 503, 504].includes(response.status)) { queueOrder(order); done(); return; }
+        return response.json().then(data => {
+          if (!response.ok) {
+            const msg = typeof data.detail === 'string' ? data.detail : 'Checkout failed';
+            if (window.showToast) window.showToast(msg, 'error', 3000); else alert(msg);
+            if (checkoutBtn) { checkoutBtn.disabled = false; checkoutBtn.textContent = checkoutLabel; }
+            return;
+          }
+          const id = data.order.id;
+          const number = data.order.number;
+          localStorage.setItem('last_order_number', number);
+          // Copies the server spooled to a printer skip the browser print dialog.
+          const spooled = data.spooled || [];
+          const pages = ['customer', 'kitchen'].filter(copy => !spooled.includes(copy));
+          if (pages.length === 0) {
+            done();
+            if (window.showToast) window.showToast(`Order #${number} sent to printers`, 'success', 2000);
+            return;
+          }
+          clearCart();
+          const next = pages.length > 1 ? `next=${encodeURIComponent(`/print/${pages[1]}/${id}`)}&` : '';
+          window.location.href = `/print/${pages[0]}/${id}?${next}back=%2F&order_number=${number}`;
+        });
+      })
+      .catch(() => { queueOrder(order); done(); });
   }
 
-  // Items and Tabs
-  const tabEls = Array.from(document.querySelectorAll('.tab'));
-  const grids = Array.from(document.querySelectorAll('.items-grid'));
+  // Menu: rendered here from the JSON embedded in the page, then kept current
+  // with /api/menu/changes so price or availability edits show up without a reload.
+  function menuFromPayload(payload) {
+    const m = {version: payload.version, settings: payload.settings, categories: {}, items: {}};
+    payload.categories.forEach(c => { m.categories[c.id] = c; });
+    payload.items.forEach(i => { m.items[i.id] = i; });
+    return m;
+  }
+
+  function loadMenu() {
+    const page = menuFromPayload(MENU);
+    try {
+      // The page may be an older copy served by the service worker while offline.
+      const stored = JSON.parse(localStorage.getItem(MENU_KEY) || 'null');
+      if (stored && stored.version > page.version) return stored;
+    } catch {}
+    return page;
+  }
+
+  function saveMenu() {
+    try { localStorage.setItem(MENU_KEY, JSON.stringify(menu)); } catch {}
+  }
+
+  function applyMenuChanges(changes) {
+    if (changes.full) {
+      menu = menuFromPayload(changes);
+    } else {
+      if (changes.settings) menu.settings = changes.settings;
+      changes.deleted.categories.forEach(id => { delete menu.categories[id]; });
+      changes.deleted.items.forEach(id => { delete menu.items[id]; });
+      changes.categories.forEach(c => { menu.categories[c.id] = c; });
+      changes.items.forEach(i => { menu.items[i.id] = i; });
+      menu.version = changes.version;
+    }
+    saveMenu();
+    renderMenu();
+    refreshCartItems();
+  }
+
+  function refreshMenu() {
+    if (!navigator.onLine) return;
+    fetch(`/api/menu/changes?since=${menu.version}`)
+      .then(response => response.ok ? response.json() : null)
+      .then(changes => {
+        if (changes && (changes.full || changes.version !== menu.version)) applyMenuChanges(changes);
+      })
+      .catch(() => {});
+  }
+
+  // Keep cart prices in line with the menu and drop items that were removed or sold out.
+  function refreshCartItems() {
+    const gone = [];
+    Object.values(cart).forEach(line => {
+      const item = menu.items[line.id];
+      if (!item || !item.available) {
+        gone.push(line.name);
+        delete cart[line.id];
+      } else {
+        line.name = item.name;
+        line.price_cents = item.price_cents;
+      }
+    });
+    saveCart();
+    render();
+    if (gone.length && window.showToast) {
+      window.showToast(`No longer available: ${gone.join(', ')}`, 'error', 3000);
+    }
+  }
+
+  function bySortOrder(a, b) { return a.sort_order - b.sort_order || a.name.localeCompare(b.name); }
+
+  let tabEls = [];
+  let grids = [];
+
+  function renderMenu() {
+    taxRate = Number(menu.settings.tax_rate_percent) || 0;
+    taxLabelEl.textContent = `Tax (${taxRate.toFixed(2)}%)`;
+
+    const itemsByCat = {};
+    Object.values(menu.items).filter(i => i.available).sort(bySortOrder).forEach(i => {
+      (itemsByCat[i.category_id] = itemsByCat[i.category_id] || []).push(i);
+    });
+    const activeTab = tabEls.find(t => t.classList.contains('active'));
+    const currentCat = activeTab ? activeTab.dataset.cat : localStorage.getItem('pos_last_cat');
+
+    tabsEl.innerHTML = '';
+    gridsEl.innerHTML = '';
+    Object.values(menu.categories).sort(bySortOrder).filter(c => itemsByCat[c.id]).forEach(c => {
+      const tab = document.createElement('button');
+      tab.className = 'tab';
+      tab.setAttribute('role', 'tab');
+      tab.dataset.cat = c.name;
+      tab.textContent = c.name;
+      tabsEl.appendChild(tab);
+
+      const grid = document.createElement('div');
+      grid.className = 'items-grid';
+      grid.dataset.cat = c.name;
+      grid.hidden = true;
+      itemsByCat[c.id].forEach(i => {
+        const btn = document.createElement('button');
+        btn.className = 'card item-btn';
+        btn.title = i.name;
+        btn.dataset.id = i.id;
+        btn.dataset.name = i.name;
+        btn.dataset.price = i.price_cents;
+        btn.dataset.cat = c.name;
+        const title = document.createElement('div');
+        title.className = 'card-title';
+        title.textContent = i.name;
+        const price = document.createElement('div');
+        price.className = 'card-price';
+        price.textContent = money(i.price_cents);
+        btn.appendChild(title);
+        btn.appendChild(price);
+        grid.appendChild(btn);
+      });
+      gridsEl.appendChild(grid);
+    });
+
+    tabEls = Array.from(tabsEl.children);
+    grids = Array.from(gridsEl.children);
+    menuEmptyEl.hidden = tabEls.length > 0;
+    cacheItems();
+
+    // Stay on the category the cashier was looking at, if it still exists.
+    const startTab = tabEls.find(t => t.dataset.cat === currentCat) || tabEls[0];
+    if (startTab) showCat(startTab.dataset.cat);
+    if ((searchIn.value || '').trim().length >= 2) enhancedSearch();
+  }
 
   function showCat(cat) {
     tabEls.forEach(b => {
@@ -213,16 +477,10 @@
     filterCards(); // apply search filter for the visible cat
   }
 
-  tabEls.forEach(btn => btn.addEventListener('click', () => showCat(btn.dataset.cat)));
-
-  // Default category: remember last or pick the first
-  const lastCat = localStorage.getItem('pos_last_cat');
-  const firstTab = tabEls[0];
-  const startCat = (lastCat && tabEls.find(t => t.dataset.cat === lastCat)) ? lastCat : (firstTab ? firstTab.dataset.cat : null);
-  
-  if (startCat) {
-    showCat(startCat);
-  }
+  tabsEl.addEventListener('click', (e) => {
+    const tab = e.target.closest('.tab');
+    if (tab) showCat(tab.dataset.cat);
+  });
 
   // Cache all items for search
   function cacheItems() {
@@ -273,11 +531,10 @@
     }
   }
 
-  // Wire item buttons
-  document.querySelectorAll('.item-btn').forEach(btn => {
-    btn.addEventListener('click', () => {
-      addItem(btn.dataset.id, btn.dataset.name, Number(btn.dataset.price));
-    });
+  // Wire item buttons (the grid is re-rendered on menu changes, so delegate)
+  gridsEl.addEventListener('click', (e) => {
+    const btn = e.target.closest('.item-btn');
+    if (btn) addItem(btn.dataset.id, btn.dataset.name, Number(btn.dataset.price));
   });
 
   // Payment behavior
@@ -371,10 +628,15 @@
         .then(response => response.json())
         .then(data => {
           const orderId = data.order.id;
-          window.open(`/print/customer/${orderId}`, '_blank');
-          setTimeout(() => {
-            window.open(`/print/kitchen/${orderId}`, '_blank');
-          }, 1000);
+          // Copies with a configured printer are reprinted by the server spooler.
+          return fetch(`/api/print/${orderId}`, {method: 'POST'})
+            .then(response => response.json())
+            .then(result => {
+              const spooled = (result.jobs || []).map(job => job.copy);
+              ['customer', 'kitchen'].filter(copy => !spooled.includes(copy)).forEach((copy, i) => {
+                setTimeout(() => window.open(`/print/${copy}/${orderId}`, '_blank'), i * 1000);
+              });
+            });
         })
         .catch(() => {
           if (window.showToast) {
@@ -392,10 +654,26 @@
     }
   });
 
+  // Offline mode: cache the POS shell and drain the queue whenever the server is reachable
+  if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('/sw.js').catch(() => {});
+  }
+  window.addEventListener('online', syncOutbox);
+  window.addEventListener('offline', renderOutbox);
+  setInterval(syncOutbox, SYNC_INTERVAL_MS);
+
+  window.addEventListener('online', refreshMenu);
+  document.addEventListener('visibilitychange', () => { if (!document.hidden) refreshMenu(); });
+  setInterval(refreshMenu, MENU_POLL_MS);
+
   // Initialize
   loadCart();
-  render();
-  cacheItems();
+  menu = loadMenu();
+  saveMenu();
+  renderMenu();
+  refreshCartItems();
+  syncOutbox();
+  refreshMenu();
   
   // Show welcome message
   if (window.showToast && Object.keys(cart).length === 0) {
@@ -0,0 +1,75 @@
+// Offline support for the POS till.
+// The POS page (which carries the menu) is served network-first so a reachable
+// server always wins, and falls back to the last cached copy during an outage.
+// Pages link static assets by content hash (/static/app.css?v=...); those URLs
+// never change, so they are served cache-first. Unversioned asset requests are
+// served from cache and refreshed in the background. Offline, a versioned URL
+// that was never fetched falls back to any cached copy of the same file.
+// Order writes are never cached here: pos.js queues them in localStorage and
+// replays them through /api/orders/sync.
+const CACHE = 'crispino-pos-v2';
+const PRECACHE = ['/', '/static/app.css', '/static/pos.js', '/static/logo.svg'];
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(
+    caches.open(CACHE).then(cache => cache.addAll(PRECACHE)).then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys.filter(k => k !== CACHE).map(k => caches.delete(k))))
+      .then(() => self.clients.claim())
+  );
+});
+
+function networkFirst(request) {
+  return fetch(request)
+    .then(response => {
+      if (response.ok) {
+        const copy = response.clone();
+        caches.open(CACHE).then(cache => cache.put(request, copy));
+      }
+      return response;
+    })
+    .catch(() => caches.match(request).then(hit => hit || caches.match('/')));
+}
+
+function staleWhileRevalidate(request) {
+  return caches.open(CACHE).then(cache =>
+    cache.match(request).then(hit => {
+      const refresh = fetch(request)
+        .then(response => {
+          if (response.ok) cache.put(request, response.clone());
+          return response;
+        })
+        .catch(() => hit || cache.match(request, {ignoreSearch: true}));
+      return hit || refresh;
+    })
+  );
+}
+
+function cacheFirst(request) {
+  return caches.open(CACHE).then(cache =>
+    cache.match(request).then(hit => hit || fetch(request)
+      .then(response => {
+        if (response.ok) cache.put(request, response.clone());
+        return response;
+      })
+      .catch(() => cache.match(request, {ignoreSearch: true})))
+  );
+}
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+
+  if (url.pathname === '/') {
+    event.respondWith(networkFirst(request));
+  } else if (url.pathname.startsWith('/static/')) {
+    event.respondWith(url.searchParams.has('v') ? cacheFirst(request) : staleWhileRevalidate(request));
+  }
+});
@@ -0,0 +1,87 @@
+"""
+Checkout latency microbenchmark.
+
+Runs db.create_order_from_cart from 1, 10 and 50 concurrent client threads
+against a scratch database and prints p50/p99 latency and throughput.
+
+    python scripts/bench_checkout.py --clients 1 10 50 --orders 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def setup_paths() -> str:
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    if base_dir not in sys.path:
+        sys.path.insert(0, base_dir)
+    return base_dir
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def run_level(db, clients: int, orders: int):
+    latencies = []
+    lock = threading.Lock()
+    cart = [{"item_id": 1, "qty": 2}, {"item_id": 5, "qty": 1}, {"item_id": 9, "qty": 1}]
+
+    def client() -> None:
+        mine = []
+        for _ in range(orders):
+            t0 = time.perf_counter()
+            db.create_order_from_cart(cart, "cash", 0, "")
+            mine.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=client) for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--orders", type=int, default=200, help="checkouts per client")
+    parser.add_argument("--data-dir", default=None,
+                        help="keep the scratch database here (default: a temp dir removed afterwards)")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        return run(args, args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="crispino_bench_") as data_dir:
+        return run(args, data_dir)
+
+
+def run(args: argparse.Namespace, data_dir: str) -> int:
+    os.environ["CRISPINO_DATA_DIR"] = data_dir
+    setup_paths()
+    from app import db
+
+    db.ensure_schema()
+    print(f"{'clients':>8}{'orders':>8}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'orders/s':>10}")
+    for clients in args.clients:
+        latencies, elapsed = run_level(db, clients, args.orders)
+        print(
+            f"{clients:>8}{len(latencies):>8}{statistics.median(latencies):>10.2f}"
+            f"{percentile(latencies, 99):>10.2f}{statistics.fmean(latencies):>10.2f}{len(latencies) / elapsed:>10.0f}"
+        )
+    db.close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+Benchmark the hot order/report queries before and after the schema index pack
+and sales rollups.
+
+Builds a synthetic database (default: 1M order lines) in a scratch directory,
+times the legacy query shapes without indexes, then applies migration 1 and
+times the current app/db.py functions (indexes + rollups) against the same data.
+
+    python scripts/bench_queries.py --lines 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def setup_paths() -> str:
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    if base_dir not in sys.path:
+        sys.path.insert(0, base_dir)
+    return base_dir
+
+
+# Query shapes as they were before migration 1 (non-sargable DATE() filters).
+LEGACY = {
+    "get_order": [
+        ("SELECT * FROM orders WHERE id=?", "order_id"),
+        ("SELECT * FROM order_items WHERE order_id=? ORDER BY id", "order_id"),
+    ],
+    "get_daily_report": [
+        ("SELECT * FROM orders WHERE DATE(created_at) = ? ORDER BY created_at", "date"),
+        (
+            """SELECT oi.name, oi.category_name, SUM(oi.qty) as total_qty,
+                      SUM(oi.qty * oi.unit_price_cents) as total_revenue
+               FROM order_items oi JOIN orders o ON oi.order_id = o.id
+               WHERE DATE(o.created_at) = ?
+               GROUP BY oi.name, oi.category_name ORDER BY total_revenue DESC""",
+            "date",
+        ),
+    ],
+    "get_popular_items": [
+        (
+            """SELECT oi.name, oi.category_name, SUM(oi.qty) as total_qty,
+                      SUM(oi.qty * oi.unit_price_cents) as total_revenue,
+                      COUNT(DISTINCT o.id) as order_count
+               FROM order_items oi JOIN orders o ON oi.order_id = o.id
+               WHERE o.created_at >= ?
+               GROUP BY oi.name, oi.category_name ORDER BY total_qty DESC LIMIT 10""",
+            "since",
+        ),
+    ],
+    "list_categories": [
+        (
+            """SELECT c.*, (SELECT COUNT(*) FROM items i WHERE i.category_id = c.id) AS item_count
+               FROM categories c ORDER BY c.sort_order, c.name""",
+            None,
+        ),
+    ],
+}
+
+
+def generate_history(db, target_lines: int, days: int, seed: int = 7) -> None:
+    rng = random.Random(seed)
+    conn = db.acquire()
+    try:
+        menu = list(conn.execute(
+            "SELECT i.id, i.name, i.price_cents, c.name AS category_name FROM items i JOIN categories c ON i.category_id=c.id"
+        ))
+        start = datetime.now() - timedelta(days=days)
+        per_day = max(1, target_lines // 3 // days)
+        order_id = 0
+        line_id = 0
+        orders, lines = [], []
+        with conn:
+            while line_id < target_lines:
+                order_id += 1
+                created = start + timedelta(seconds=int(order_id * 86400 / per_day))
+                picks = rng.sample(menu, k=min(len(menu), rng.randint(1, 5)))
+                subtotal = 0
+                for it in picks:
+                    line_id += 1
+                    qty = rng.randint(1, 3)
+                    subtotal += qty * it["price_cents"]
+                    lines.append((line_id, order_id, it["id"], it["name"], it["price_cents"], qty, it["category_name"]))
+                orders.append((order_id, 100000 + order_id, created.strftime("%Y-%m-%d %H:%M:%S"), subtotal, 0,
+                               subtotal, rng.choice(("cash", "card", "other")), ""))
+                if len(lines) >= 50000:
+                    _flush(conn, orders, lines)
+            _flush(conn, orders, lines)
+            conn.execute("UPDATE order_sequence SET value=? WHERE name='orders'", (100000 + order_id,))
+    finally:
+        db.release(conn)
+
+
+def _flush(conn, orders, lines) -> None:
+    conn.executemany("INSERT INTO orders(id, number, created_at, total_cents, tax_cents, paid_cents, payment_method, note) VALUES(?,?,?,?,?,?,?,?)", orders)
+    conn.executemany("INSERT INTO order_items(id, order_id, item_id, name, unit_price_cents, qty, category_name) VALUES(?,?,?,?,?,?,?)", lines)
+    orders.clear()
+    lines.clear()
+
+
+def timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=1_000_000, help="order lines to generate")
+    parser.add_argument("--days", type=int, default=365, help="days of history to spread them over")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--data-dir", default=None, help="scratch directory (default: a new temp dir)")
+    args = parser.parse_args(argv)
+
+    os.environ["CRISPINO_DATA_DIR"] = args.data_dir or tempfile.mkdtemp(prefix="crispino_bench_")
+    setup_paths()
+    from app import db
+
+    print(f"Database: {db.DB_PATH}")
+    db.ensure_schema()
+    conn = db.acquire()
+    has_orders = conn.execute("SELECT COUNT(*) AS c FROM order_items").fetchone()["c"]
+    db.release(conn)
+    if not has_orders:
+        t0 = time.perf_counter()
+        generate_history(db, args.lines, args.days)
+        db.backfill_rollups()
+        print(f"Generated {args.lines} order lines in {time.perf_counter() - t0:.1f}s")
+
+    conn = db.acquire()
+    last = conn.execute("SELECT id, created_at FROM orders ORDER BY id DESC LIMIT 1").fetchone()
+    params = {
+        "order_id": last["id"] // 2,
+        "date": last["created_at"][:10],
+        "since": (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    # Before: drop the migration 1 indexes and run the legacy query shapes.
+    for name in ("ix_order_items_order", "ix_orders_created_at", "ix_items_category_sort"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+    before = {}
+    for label, queries in LEGACY.items():
+        def run(queries=queries):
+            for sql, key in queries:
+                conn.execute(sql, (params[key],) if key else ()).fetchall()
+        before[label] = timed(run, args.repeat)
+
+    # After: re-apply migration 1 and time the current db functions.
+    for version, _, apply in db.MIGRATIONS:
+        if version == 1:
+            with conn:
+                apply(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    db.release(conn)
+    current = {
+        "get_order": lambda: db.get_order(params["order_id"]),
+        "get_daily_report": lambda: db.get_daily_report(params["date"]),
+        "get_popular_items": lambda: db.get_popular_items(7, 10),
+        "list_categories": db.list_categories,
+    }
+    print(f"{'query':<20}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for label, fn in current.items():
+        after = timed(fn, args.repeat)
+        print(f"{label:<20}{before[label]:>12.2f}{after:>12.2f}{before[label] / max(after, 1e-6):>9.1f}x")
+
+    db.close_pool()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+"""
+End-to-end benchmark suite for the POS app.
+
+Generates a synthetic crispino.db at a configurable scale (menu size, months of
+history, orders per day, lines per order), then drives the real FastAPI app
+in-process with concurrent clients through each scenario: POS render,
+checkout, history paging and search, daily/range/popular reports, order
+export and admin edits, plus a weighted mix of all of them. Results
+(throughput, latency percentiles, errors) are written as JSON and compared
+against a stored baseline; any scenario that regresses beyond the tolerance
+makes the run exit non-zero.
+
+    python scripts/bench_suite.py                              # run and compare with the baseline
+    python scripts/bench_suite.py --save-baseline              # record a new baseline
+    python scripts/bench_suite.py --months 12 --orders-per-day 400 --clients 20
+
+Needs httpx (pip install httpx). Baselines are machine-specific: record one on
+the machine you compare on, and keep the scale options the same.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SCRIPTS_DIR, "bench_baseline.json")
+DEFAULT_OUTPUT = "bench_results.json"
+
+
+def setup_paths() -> str:
+    base_dir = os.path.abspath(os.path.join(SCRIPTS_DIR, ".."))
+    if base_dir not in sys.path:
+        sys.path.insert(0, base_dir)
+    # main.py imports its sibling module as plain `db`
+    app_dir = os.path.join(base_dir, "app")
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+    return base_dir
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+# --- Synthetic data ---
+
+def generate_database(db, args: argparse.Namespace) -> None:
+    """Replace the menu and order history with a seeded synthetic data set."""
+    rng = random.Random(args.seed)
+    conn = db.acquire()
+    try:
+        with conn:
+            for table in ("order_items", "orders", "items", "categories"):
+                conn.execute(f"DELETE FROM {table}")
+            categories = max(1, args.menu_items // 10)
+            conn.executemany(
+                "INSERT INTO categories(id, name, sort_order) VALUES(?,?,?)",
+                [(c, f"Category {c}", c) for c in range(1, categories + 1)],
+            )
+            menu = []
+            for i in range(1, args.menu_items + 1):
+                cat = (i - 1) % categories + 1
+                menu.append((i, f"Item {i} {rng.choice(WORDS)}", rng.randrange(150, 2500, 50), cat, f"Category {cat}"))
+            conn.executemany(
+                "INSERT INTO items(id, name, price_cents, category_id, available, sort_order) VALUES(?,?,?,?,1,?)",
+                [(i, name, price, cat, i) for i, name, price, cat, _ in menu],
+            )
+
+            days = max(1, int(args.months * 30))
+            start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+            order_id = line_id = 0
+            orders, lines = [], []
+            for day in range(days):
+                opening = start + timedelta(days=day, hours=8)
+                for n in range(args.orders_per_day):
+                    order_id += 1
+                    created = opening + timedelta(seconds=int(n * 14 * 3600 / args.orders_per_day))
+                    count = max(1, min(len(menu), int(rng.triangular(1, 2 * args.lines_per_order, args.lines_per_order))))
+                    subtotal = 0
+                    for item_id, name, price, _, category_name in rng.sample(menu, k=count):
+                        line_id += 1
+                        qty = rng.randint(1, 3)
+                        subtotal += qty * price
+                        lines.append((line_id, order_id, item_id, name, price, qty, category_name))
+                    orders.append((
+                        order_id, 1000 + order_id, created.strftime("%Y-%m-%d %H:%M:%S"), subtotal, 0, subtotal,
+                        rng.choice(("cash", "card", "other")), rng.choice(NOTES),
+                    ))
+                    if len(lines) >= 50000:
+                        _flush(conn, orders, lines)
+            _flush(conn, orders, lines)
+            conn.execute("UPDATE order_sequence SET value=? WHERE name='orders'", (1000 + order_id,))
+    finally:
+        db.release(conn)
+    db.backfill_rollups()
+    db.rebuild_order_search()
+    db.invalidate_menu_cache()
+    conn = db.acquire()
+    try:
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        db.release(conn)
+
+
+WORDS = ("Latte", "Mocha", "Chai", "Panini", "Muffin", "Wrap", "Soda", "Tart", "Bagel", "Smoothie")
+NOTES = ("", "", "", "no sugar", "extra hot", "takeaway", "oat milk")
+
+
+def _flush(conn, orders, lines) -> None:
+    conn.executemany("INSERT INTO orders(id, number, created_at, total_cents, tax_cents, paid_cents, payment_method, note) VALUES(?,?,?,?,?,?,?,?)", orders)
+    conn.executemany("INSERT INTO order_items(id, order_id, item_id, name, unit_price_cents, qty, category_name) VALUES(?,?,?,?,?,?,?)", lines)
+    orders.clear()
+    lines.clear()
+
+
+def scale_of(args: argparse.Namespace) -> dict:
+    return {
+        "menu_items": args.menu_items,
+        "months": args.months,
+        "orders_per_day": args.orders_per_day,
+        "lines_per_order": args.lines_per_order,
+        "seed": args.seed,
+    }
+
+
+# --- Scenarios ---
+# Each scenario builds one request from a seeded RNG and the data set's shape.
+
+class Shape:
+    def __init__(self, db) -> None:
+        conn = db.acquire()
+        try:
+            self.items = [dict(r) for r in conn.execute("SELECT id, name, price_cents, category_id, sort_order FROM items")]
+            bounds = conn.execute("SELECT MIN(created_at) AS lo, MAX(created_at) AS hi, MAX(id) AS last, MAX(number) AS num FROM orders").fetchone()
+        finally:
+            db.release(conn)
+        self.first_day = datetime.strptime((bounds["lo"] or db.now_iso())[:10], "%Y-%m-%d")
+        self.days = max(1, (datetime.strptime((bounds["hi"] or db.now_iso())[:10], "%Y-%m-%d") - self.first_day).days + 1)
+        self.last_id = bounds["last"] or 0
+        self.last_number = bounds["num"] or 1000
+
+    def day(self, rng: random.Random) -> str:
+        return (self.first_day + timedelta(days=rng.randrange(self.days))).strftime("%Y-%m-%d")
+
+
+def req_pos(rng, shape):
+    return "GET", "/", None
+
+
+def req_checkout(rng, shape):
+    picks = rng.sample(shape.items, k=min(len(shape.items), rng.randint(1, 4)))
+    return "POST", "/api/orders", {"json": {
+        "items": [{"item_id": it["id"], "qty": rng.randint(1, 3)} for it in picks],
+        "payment_method": rng.choice(("cash", "card")),
+        "note": rng.choice(NOTES),
+    }}
+
+
+def req_history(rng, shape):
+    before = rng.randint(1, shape.last_id + 1) if rng.random() < 0.5 else None
+    return "GET", "/api/orders", {"params": {"limit": 50, **({"before_id": before} if before else {})}}
+
+
+def req_search(rng, shape):
+    roll = rng.random()
+    if roll < 0.3:
+        q = str(rng.randint(1001, shape.last_number))
+    elif roll < 0.7:
+        q = rng.choice(WORDS)[:4]
+    else:
+        q = rng.choice(NOTES[3:])
+    return "GET", "/api/orders/search", {"params": {"q": q, "limit": 20}}
+
+
+def req_daily(rng, shape):
+    return "GET", "/api/reports/daily", {"params": {"date": shape.day(rng)}}
+
+
+def req_range(rng, shape):
+    lo = shape.day(rng)
+    hi = (datetime.strptime(lo, "%Y-%m-%d") + timedelta(days=rng.choice((7, 30, 90)))).strftime("%Y-%m-%d")
+    return "GET", "/api/reports/range", {"params": {"from": lo, "to": hi, "group_by": rng.choice(("day", "item", "category"))}}
+
+
+def req_popular(rng, shape):
+    return "GET", "/api/items/popular", {"params": {"days": rng.choice((7, 30, 90)), "limit": 10}}
+
+
+def req_export(rng, shape):
+    return "GET", "/api/export/orders", {"params": {"after": rng.randint(0, max(0, shape.last_id - 500)), "limit": 500}}
+
+
+def req_admin_edit(rng, shape):
+    it = rng.choice(shape.items)
+    return "POST", "/admin/item/update", {"data": {
+        "item_id": it["id"], "name": it["name"], "price_rupees": f"{it['price_cents'] / 100:.2f}",
+        "category_id": it["category_id"], "available": "1", "sort_order": it["sort_order"],
+    }}
+
+
+SCENARIOS = {
+    "pos_render": req_pos,
+    "checkout": req_checkout,
+    "history_page": req_history,
+    "history_search": req_search,
+    "daily_report": req_daily,
+    "range_report": req_range,
+    "popular_items": req_popular,
+    "order_export": req_export,
+    "admin_edit": req_admin_edit,
+}
+
+# A till-heavy day: mostly POS renders and checkouts, with back-office traffic on the side.
+MIX = {
+    "pos_render": 30, "checkout": 30, "history_page": 8, "history_search": 8, "daily_report": 6,
+    "range_report": 4, "popular_items": 6, "order_export": 4, "admin_edit": 4,
+}
+
+
+async def run_scenario(client, shape, name: str, requests: int, clients: int, seed: int) -> dict:
+    rng = random.Random(f"{seed}:{name}")
+    if name == "mixed":
+        names, weights = zip(*MIX.items())
+        plan = [SCENARIOS[n](rng, shape) for n in rng.choices(names, weights=weights, k=requests)]
+    else:
+        plan = [SCENARIOS[name](rng, shape) for _ in range(requests)]
+    queue = list(reversed(plan))
+    latencies, errors = [], []
+
+    async def worker() -> None:
+        while queue:
+            method, url, kwargs = queue.pop()
+            t0 = time.perf_counter()
+            try:
+                response = await client.request(method, url, **(kwargs or {}))
+                await response.aread()
+                if response.status_code >= 400:
+                    errors.append(f"{method} {url} -> {response.status_code}")
+            except Exception as e:
+                errors.append(f"{method} {url} -> {e!r}")
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p90_ms": round(percentile(latencies, 90), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def run_suite(app, db, args: argparse.Namespace) -> dict:
+    import httpx
+
+    shape = Shape(db)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", follow_redirects=False) as client:
+        for name in args.scenarios:
+            await run_scenario(client, shape, name, max(args.clients, args.requests // 10), args.clients, args.seed + 1)  # warm-up
+            results[name] = await run_scenario(client, shape, name, args.requests, args.clients, args.seed)
+            r = results[name]
+            print(f"{name:<16}{r['requests']:>7}{r['errors']:>7}{r['throughput_rps']:>10.1f}"
+                  f"{r['p50_ms']:>10.2f}{r['p90_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    return results
+
+
+# --- Baseline comparison ---
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Scenarios whose p50/p99 rose or throughput fell by more than the tolerance."""
+    regressions = []
+    for name, now in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before:
+            continue
+        for key in ("p50_ms", "p99_ms"):
+            if now[key] > before[key] * (1 + tolerance) and now[key] - before[key] > 1.0:
+                regressions.append(f"{name}: {key} {before[key]} -> {now[key]}")
+        if now["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput_rps {before['throughput_rps']} -> {now['throughput_rps']}")
+        if now["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {now['errors']}")
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--menu-items", type=int, default=60)
+    parser.add_argument("--months", type=float, default=6)
+    parser.add_argument("--orders-per-day", type=int, default=250)
+    parser.add_argument("--lines-per-order", type=int, default=3, help="average lines per order")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--clients", type=int, default=10, help="concurrent in-process clients")
+    parser.add_argument("--requests", type=int, default=300, help="requests per scenario")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS) + ["mixed"],
+                        choices=list(SCENARIOS) + ["mixed"])
+    parser.add_argument("--data-dir", default=None,
+                        help="keep the generated database here and reuse it when the scale matches (default: a temp dir removed afterwards)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="results JSON path")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before failing")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        return run(args, args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="crispino_suite_") as data_dir:
+        return run(args, data_dir)
+
+
+def run(args: argparse.Namespace, data_dir: str) -> int:
+    os.environ["CRISPINO_DATA_DIR"] = data_dir
+    setup_paths()
+    import db
+    from main import app
+
+    db.ensure_schema()
+    scale = scale_of(args)
+    marker = os.path.join(data_dir, "bench_scale.json")
+    reuse = os.path.exists(marker) and json.load(open(marker)) == scale
+    if not reuse:
+        t0 = time.perf_counter()
+        generate_database(db, args)
+        with open(marker, "w") as f:
+            json.dump(scale, f)
+        print(f"Generated {scale} in {time.perf_counter() - t0:.1f}s at {db.DB_PATH}")
+    else:
+        print(f"Reusing {db.DB_PATH}")
+
+    print(f"{'scenario':<16}{'reqs':>7}{'errs':>7}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    scenarios = asyncio.run(run_suite(app, db, args))
+    db.shutdown_executors()
+    db.close_pool()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "clients": args.clients,
+            "requests": args.requests,
+            "scale": scale,
+        },
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against (run with --save-baseline).")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("scale") != scale or baseline["meta"].get("clients") != args.clients:
+        print("Baseline was recorded at a different scale or client count; not comparing.")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print("REGRESSION:", line)
+    if not regressions:
+        print(f"OK: within {args.tolerance:.0%} of the baseline from {baseline['meta']['timestamp']}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Stand-in for a network receipt printer, for trying the print spooler without hardware.
+
+Listens on a raw TCP port like a thermal printer's JetDirect port and saves
+each job it receives to the output directory (one .bin file per connection),
+printing a plain-text preview with the ESC/POS control codes stripped.
+
+    python scripts/fake_printer.py --port 9100 --out printer_jobs
+    # then set the receipt/kitchen printer in /admin to tcp://127.0.0.1:9100
+
+--offline SECONDS keeps the port closed for a while first (a printer that is
+switched off or still booting), to watch the spooler retry.
+"""
+import argparse
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+
+# ESC/GS commands with their argument bytes, as emitted by db.render_escpos.
+_ESCPOS_CODES = re.compile(rb"\x1b[@]|\x1b[aEd!].|\x1dV..|\x1d!.", re.DOTALL)
+
+
+def preview(data: bytes) -> str:
+    return _ESCPOS_CODES.sub(b"", data).decode("cp437", errors="replace").rstrip()
+
+
+class PrinterHandler(socketserver.BaseRequestHandler):
+    server: "FakePrinter"
+
+    def handle(self) -> None:
+        chunks = []
+        while True:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        data = b"".join(chunks)
+        path = self.server.save(data)
+        print(f"[{time.strftime('%H:%M:%S')}] {len(data)} bytes -> {path}")
+        if not self.server.quiet:
+            print(preview(data))
+            print("-" * 48)
+
+
+class FakePrinter(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, out_dir: str, quiet: bool = False) -> None:
+        super().__init__(address, PrinterHandler)
+        self.out_dir = out_dir
+        self.quiet = quiet
+        self._count = 0
+        self._lock = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+
+    def save(self, data: bytes) -> str:
+        with self._lock:
+            self._count += 1
+            path = os.path.join(self.out_dir, f"job_{self._count:05d}.bin")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Fake raw-TCP (port 9100) receipt printer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--out", default="printer_jobs", help="directory for received jobs")
+    parser.add_argument("--offline", type=float, default=0, help="seconds to wait before listening")
+    parser.add_argument("--quiet", action="store_true", help="do not print job previews")
+    args = parser.parse_args()
+
+    if args.offline:
+        print(f"Printer offline for {args.offline:g}s")
+        time.sleep(args.offline)
+    with FakePrinter((args.host, args.port), args.out, quiet=args.quiet) as server:
+        print(f"Fake printer on tcp://{args.host}:{args.port}, saving jobs to {args.out}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,7 @@
 import os
 import sys
 import logging
+import multiprocessing
 import threading
 import time
 import webbrowser
@@ -30,6 +31,10 @@ def setup_paths() -> str:
 
     if base_dir not in sys.path:
         sys.path.insert(0, base_dir)
+    # app/main.py imports its sibling module as plain `db`.
+    app_dir = os.path.join(base_dir, "app")
+    if app_dir not in sys.path:
+        sys.path.insert(1, app_dir)
 
     try:
         os.chdir(base_dir)
@@ -73,6 +78,19 @@ def setup_logging(base_dir: str) -> logging.Logger:
     except Exception:
         pass
 
+    # Opt-in slow-query log (CRISPINO_SLOW_QUERY_MS) goes to its own file.
+    if os.getenv("CRISPINO_SLOW_QUERY_MS"):
+        sql_logger = logging.getLogger("crispino.sql")
+        sql_logger.setLevel(logging.WARNING)
+        sql_logger.handlers[:] = []
+        sql_logger.propagate = False
+        try:
+            sh = RotatingFileHandler(os.path.join(logs_dir, "slow_queries.log"), maxBytes=1_000_000, backupCount=3, encoding="utf-8")
+            sh.setFormatter(logging.Formatter("[%(asctime)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+            sql_logger.addHandler(sh)
+        except Exception:
+            pass
+
     return logger
 
 def _open_browser(url: str, delay: float = 0.6) -> None:
@@ -119,17 +137,38 @@ def main() -> int:
     except ValueError:
         port = 8000
 
+    # CRISPINO_WORKERS > 1 runs that many server processes on the shared (WAL)
+    # database; the app reads the same variable to keep its caches coherent.
+    try:
+        workers = max(1, int(os.getenv("CRISPINO_WORKERS", "1")))
+    except ValueError:
+        workers = 1
+    os.environ["CRISPINO_WORKERS"] = str(workers)
+
+    if workers > 1:
+        # Migrate once here, before the workers start; their own startup check then finds nothing to do.
+        try:
+            import db
+            db.ensure_schema()
+            db.close_pool()
+        except Exception as e:
+            log(f"Database setup failed: {e}")
+            _msgbox("Startup error", f"Database setup failed:\n{e}")
+            return 1
+
     url = f"http://{host}:{port}"
-    log(f"Starting server on {url}")
+    log(f"Starting server on {url}" + (f" with {workers} workers" if workers > 1 else ""))
 
     # Open the browser shortly after startup (helps when double-clicking a windowed EXE).
     _open_browser(url)
 
     try:
         uvicorn.run(
-            fastapi_app,
+            # Worker processes import the app themselves, so they need it by name.
+            "app.main:app" if workers > 1 else fastapi_app,
             host=host,
             port=port,
+            workers=workers,
             reload=False,
             log_level=os.getenv("LOG_LEVEL", "info"),
             log_config=None,   # critical in frozen apps to avoid stdout/isatty issues
@@ -152,4 +191,5 @@ def main() -> int:
     return 0
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # worker processes of a frozen build start by re-running the EXE
     sys.exit(main())
\ No newline at end of file
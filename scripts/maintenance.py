@@ -0,0 +1,70 @@
+"""
+Offline maintenance commands for the Crispino database.
+
+Run these with the POS server stopped:
+
+    python scripts/maintenance.py renumber-ids
+    python scripts/maintenance.py backfill-rollups
+    python scripts/maintenance.py rebuild-search
+"""
+import argparse
+import os
+import sys
+
+
+def setup_paths() -> str:
+    if getattr(sys, "frozen", False):
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    if base_dir not in sys.path:
+        sys.path.insert(0, base_dir)
+    return base_dir
+
+
+def cmd_renumber_ids(db, args: argparse.Namespace) -> int:
+    db.renumber_categories_and_items()
+    print("Renumbered category and item IDs to 1..N (order_items references updated).")
+    return 0
+
+
+def cmd_backfill_rollups(db, args: argparse.Namespace) -> int:
+    db.backfill_rollups()
+    print("Rebuilt sales rollups from order history.")
+    return 0
+
+
+def cmd_rebuild_search(db, args: argparse.Namespace) -> int:
+    if not db.rebuild_order_search():
+        print("This SQLite build has no FTS5; order search uses LIKE scans, nothing to rebuild.")
+        return 0
+    print("Rebuilt the order search index from order history.")
+    return 0
+
+
+def main(argv=None) -> int:
+    setup_paths()
+    from app import db
+
+    parser = argparse.ArgumentParser(description="Crispino offline maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("renumber-ids", help="Rebuild categories/items so IDs run 1..N in display order")
+    p.set_defaults(func=cmd_renumber_ids)
+
+    p = sub.add_parser("backfill-rollups", help="Rebuild the daily/hourly sales rollups from order history")
+    p.set_defaults(func=cmd_backfill_rollups)
+
+    p = sub.add_parser("rebuild-search", help="Rebuild the order search (FTS) index from order history")
+    p.set_defaults(func=cmd_rebuild_search)
+
+    args = parser.parse_args(argv)
+    db.ensure_schema()
+    try:
+        return args.func(db, args)
+    finally:
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Concurrency stress test for checkout order-number allocation.
+
+Fires thousands of checkouts from several processes x threads against a
+scratch database, then asserts that order numbers are unique and gap-free
+and that no checkout failed. Exits non-zero on any violation.
+
+    python scripts/stress_checkout.py --processes 4 --threads 8 --orders 250
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+def setup_paths() -> str:
+    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    if base_dir not in sys.path:
+        sys.path.insert(0, base_dir)
+    return base_dir
+
+
+def _worker(data_dir: str, threads: int, orders: int, results) -> None:
+    os.environ["CRISPINO_DATA_DIR"] = data_dir
+    setup_paths()
+    from app import db
+
+    errors = []
+    numbers = []
+    lock = threading.Lock()
+
+    def run() -> None:
+        for n in range(orders):
+            try:
+                _, number = db.create_order_from_cart([{"item_id": 1 + n % 3, "qty": 1}], "cash", 0, "")
+                with lock:
+                    numbers.append(number)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+
+    pool = [threading.Thread(target=run) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    db.close_pool()
+    results.put((len(numbers), errors[:5], len(errors)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--orders", type=int, default=100, help="checkouts per thread")
+    parser.add_argument("--data-dir", default=None,
+                        help="keep the scratch database here (default: a temp dir removed afterwards)")
+    args = parser.parse_args(argv)
+
+    if args.data_dir:
+        os.makedirs(args.data_dir, exist_ok=True)
+        return run(args, args.data_dir)
+    with tempfile.TemporaryDirectory(prefix="crispino_stress_") as data_dir:
+        return run(args, data_dir)
+
+
+def run(args: argparse.Namespace, data_dir: str) -> int:
+    os.environ["CRISPINO_DATA_DIR"] = data_dir
+    setup_paths()
+    from app import db
+
+    db.ensure_schema()
+    conn = db.acquire()
+    start = int(conn.execute("SELECT value FROM order_sequence WHERE name='orders'").fetchone()["value"])
+    db.release(conn)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(data_dir, args.threads, args.orders, results))
+        for _ in range(args.processes)
+    ]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    outcomes = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    expected = args.processes * args.threads * args.orders
+    ok_count = sum(o[0] for o in outcomes)
+    failures = sum(o[2] for o in outcomes)
+    conn = db.acquire()
+    numbers = [r["number"] for r in conn.execute("SELECT number FROM orders ORDER BY number")]
+    seq = int(conn.execute("SELECT value FROM order_sequence WHERE name='orders'").fetchone()["value"])
+    db.release(conn)
+    db.close_pool()
+
+    print(f"{ok_count}/{expected} checkouts in {elapsed:.1f}s ({ok_count / elapsed:.0f}/s), {failures} failed")
+    problems = []
+    if failures:
+        problems.append(f"{failures} checkouts failed, e.g. {[e for o in outcomes for e in o[1]][:3]}")
+    if len(numbers) != len(set(numbers)):
+        problems.append("duplicate order numbers")
+    if numbers != list(range(start + 1, start + len(numbers) + 1)):
+        problems.append("order numbers are not contiguous")
+    if seq != start + len(numbers) or len(numbers) != ok_count:
+        problems.append(f"sequence at {seq}, expected {start + len(numbers)} for {len(numbers)} orders")
+    for problem in problems:
+        print("FAIL:", problem)
+    if not problems:
+        print(f"OK: numbers {start + 1}..{start + len(numbers)} unique and gap-free")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())